@@ -0,0 +1,136 @@
+import os
+import hashlib
+import threading
+from cachetools import LRUCache
+from disk_cache import DiskCache
+from bin_index import RECYCLING_DATA_FILE, tokenize
+
+# Da incrementare quando cambia il prompt o il formato delle risposte
+ADVICE_FORMAT_VERSION = "2"
+ADVICE_CACHE_SIZE = 5000
+ADVICE_CACHE_TTL = 30 * 24 * 3600
+MEMORY_CACHE_SIZE = 1000
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def item_key(item):
+    """Normalized form of an item name: "Plastic Bottles" and "bottle, plastic" share a key."""
+    return " ".join(sorted(set(tokenize(item))))
+
+
+class AdviceCache:
+    """
+    Recycling advice per normalized item name.
+
+    A small in-memory LRU sits in front of a DiskCache shared by every
+    process. Keys include a version derived from the content of data.json,
+    so editing the guidelines invalidates every cached answer.
+    """
+
+    def __init__(self, version, disk=None, memory_size=MEMORY_CACHE_SIZE):
+        self.version = version
+        self.disk = disk if disk is not None else DiskCache("recycling_advice", max_entries=ADVICE_CACHE_SIZE, ttl=ADVICE_CACHE_TTL)
+        self.memory = LRUCache(maxsize=memory_size)
+        self._lock = threading.Lock()
+
+    def _key(self, item):
+        return f"{self.version}:{item_key(item)}"
+
+    def get(self, item):
+        """
+        Cached advice for an item.
+
+        Returns:
+            dict: The card fields, or None on a miss
+        """
+        key = self._key(item)
+        with self._lock:
+            advice = self.memory.get(key)
+        if advice is not None:
+            return advice
+        hit, advice = self.disk.get(key)
+        if not hit:
+            return None
+        with self._lock:
+            self.memory[key] = advice
+        return advice
+
+    def set(self, item, advice):
+        key = self._key(item)
+        with self._lock:
+            self.memory[key] = advice
+        self.disk.set(key, advice)
+
+    def split(self, items):
+        """
+        Separate cached and uncached items.
+
+        Returns:
+            tuple: (list of (item, advice) for the hits, list of missing items)
+        """
+        hits, misses = [], []
+        for item in items:
+            advice = self.get(item)
+            if advice is not None:
+                hits.append((item, advice))
+            else:
+                misses.append(item)
+        return hits, misses
+
+    def store_response(self, items, parsed_advice):
+        """
+        Cache the advice blocks of one model response, one entry per item.
+
+        Each block is matched to the requested item with the same
+        normalized name, whatever its position, since the model may
+        reorder, rename or merge items. Only when a block's name matches no
+        item, and the counts of blocks and items agree, does it fall back to
+        the item at its own position, if that item is still unmatched.
+        Blocks without an item name or a bin are not cached.
+        """
+        complete = [advice for advice in parsed_advice if advice.get("Item Name") and advice.get("Correct Bin")]
+        keys = {}
+        for item in items:
+            keys.setdefault(item_key(item), item)
+        pairs = {}
+        unmatched = []
+        for position, advice in enumerate(complete):
+            item = keys.get(item_key(advice["Item Name"]))
+            if item is not None and item not in pairs:
+                pairs[item] = advice
+            else:
+                unmatched.append((position, advice))
+        if len(complete) == len(items):
+            for position, advice in unmatched:
+                # Solo se l'oggetto in quella posizione non ha gia' il suo blocco
+                if items[position] not in pairs:
+                    pairs[items[position]] = advice
+        for item, advice in pairs.items():
+            self.set(item, advice)
+
+
+def data_version(path=RECYCLING_DATA_FILE):
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    return f"{ADVICE_FORMAT_VERSION}-{digest}"
+
+
+def get_advice_cache(path=RECYCLING_DATA_FILE):
+    """
+    Return the AdviceCache for a guidelines file, shared by the whole process.
+
+    The content hash is recomputed only when the file modification time changes.
+    """
+    mtime = os.path.getmtime(path)
+    with _caches_lock:
+        cached = _caches.get(path)
+        if cached is None or cached[0] != mtime:
+            version = data_version(path)
+            if cached is not None and cached[1].version == version:
+                cached = (mtime, cached[1])
+            else:
+                cached = (mtime, AdviceCache(version))
+            _caches[path] = cached
+        return cached[1]
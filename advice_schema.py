@@ -0,0 +1,141 @@
+import json
+from dataclasses import dataclass
+
+# Identificativi dei bidoni: le chiavi di data.json, di get_bin_image e di get_background_gradient
+BIN_IDS = (
+    "brown", "green", "yellow", "blue", "grey", "white_with_green_cross",
+    "yellow_street", "battery_symbol", "red", "oil_symbol", "none",
+)
+
+# Chiavi di una lettera: il modello genera molti meno token che con "- Item Name: ..."
+ADVICE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "n": {"type": "string", "description": "item name"},
+            "b": {"enum": list(BIN_IDS), "description": "bin id"},
+            "p": {"type": "string", "description": "preparation required, empty if none"},
+            "r": {"type": "string", "description": "why this bin is correct"},
+            "s": {"type": "string", "description": "warnings or alternatives, empty if none"},
+        },
+        "required": ["n", "b", "r"],
+    },
+}
+REQUIRED_KEYS = tuple(ADVICE_SCHEMA["items"]["required"])
+STRING_KEYS = tuple(ADVICE_SCHEMA["items"]["properties"])
+
+_decoder = json.JSONDecoder()
+
+
+class AdviceFormatError(ValueError):
+    """An object of the model response does not follow ADVICE_SCHEMA."""
+
+
+@dataclass(frozen=True)
+class AdviceRecord:
+    item: str
+    bin: str
+    reason: str
+    preparation: str = ""
+    notes: str = ""
+
+    def card(self):
+        """Fields of render_advice_card, as in the text responses and in the local advice."""
+        advice = {
+            "Item Name": self.item,
+            "Correct Bin": self.bin,
+            "Preparation Required": self.preparation or "None",
+            "Reason": self.reason,
+        }
+        if self.notes:
+            advice["Special Notes"] = self.notes
+        return advice
+
+
+def parse_record(obj):
+    """
+    Validate one decoded object of the response.
+
+    Raises:
+        AdviceFormatError: Missing or empty required key, non-string value or unknown bin id
+    """
+    if not isinstance(obj, dict):
+        raise AdviceFormatError(f"expected an object, got {type(obj).__name__}")
+    for key in STRING_KEYS:
+        if key in obj and not isinstance(obj[key], str):
+            raise AdviceFormatError(f"\"{key}\" must be a string in {obj}")
+    missing = [key for key in REQUIRED_KEYS if not obj.get(key, "").strip()]
+    if missing:
+        raise AdviceFormatError(f"missing {', '.join(missing)} in {obj}")
+    bin_id = obj["b"].strip().lower()
+    if bin_id not in BIN_IDS:
+        raise AdviceFormatError(f"unknown bin \"{obj['b']}\" for {obj['n']}")
+    return AdviceRecord(
+        item=obj["n"].strip(),
+        bin=bin_id,
+        reason=obj["r"].strip(),
+        preparation=obj.get("p", "").strip(),
+        notes=obj.get("s", "").strip(),
+    )
+
+
+def _decode_objects(buffer, pos, final):
+    # Oggetti completi a partire da pos; alla fine dello stream un oggetto non valido viene saltato
+    while True:
+        start = buffer.find("{", pos)
+        if start < 0:
+            return len(buffer)
+        try:
+            obj, pos = _decoder.raw_decode(buffer, start)
+        except json.JSONDecodeError as e:
+            if not final:
+                # Oggetto non ancora completo: si riprova al prossimo "}"
+                return start
+            yield None, AdviceFormatError(f"truncated or invalid object {buffer[start:start + 80]!r} ({e.msg})")
+            pos = start + 1
+            continue
+        try:
+            yield parse_record(obj), None
+        except AdviceFormatError as e:
+            yield None, e
+
+
+def iter_advice_records(chunks):
+    """
+    Parse a streamed JSON array of advice objects in a single pass.
+
+    Every object is decoded once, as soon as its closing brace has
+    arrived; text around the objects (brackets, commas, code fences) is
+    skipped. An invalid or truncated object does not stop the others.
+
+    Args:
+        chunks: Iterable of text fragments of the response
+
+    Yields:
+        tuple: (AdviceRecord, None) for a valid object, (None, AdviceFormatError) otherwise
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if "}" in chunk:
+            pos = yield from _decode_objects(buffer, 0, final=False)
+            # Il testo gia' consumato non serve piu'
+            buffer = buffer[pos:]
+    yield from _decode_objects(buffer, 0, final=True)
+
+
+def parse_advice_json(text):
+    """
+    Parse a complete JSON response.
+
+    Returns:
+        tuple: (list of AdviceRecord, list of AdviceFormatError)
+    """
+    records, errors = [], []
+    for record, error in iter_advice_records([text]):
+        if error is None:
+            records.append(record)
+        else:
+            errors.append(error)
+    return records, errors
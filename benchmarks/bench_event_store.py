@@ -0,0 +1,72 @@
+import os
+import sys
+import glob
+import json
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from event_store import EventStore, EVENTS_GLOB, event_interval, place_key, TIMESTAMP_FORMAT
+
+REPEAT = 2000
+QUERIES = [
+    ("title \"cristina avena\"", dict(text="cristina avena")),
+    ("title any word", dict(text="Quando suona Cristina D'Avena?", match_any=True)),
+    ("running at 03/11 18:45", dict(at=datetime(2024, 11, 3, 18, 45))),
+    ("location \"music main stage\"", dict(location="music main stage")),
+    ("location \"citadel\" + date", dict(location="citadel", date="02/11/2024")),
+    ("title + running at", dict(text="workshop", at=datetime(2024, 11, 2, 15, 0))),
+]
+
+
+def scan(events, text=None, at=None, location=None, date=None, match_any=False):
+    # Riferimento: filtro lineare sulla lista caricata dai file JSON
+    words = text.lower().split() if text else []
+    timestamp = at.strftime(TIMESTAMP_FORMAT) if at else None
+    key = place_key(location) if location else None
+    result = []
+    for event in events:
+        title = event["title"].lower()
+        if words and not (any if match_any else all)(word in title for word in words):
+            continue
+        if timestamp and not (event["start"] <= timestamp < event["end"]):
+            continue
+        if key and key not in event["place"]:
+            continue
+        if date and event["date"] != date:
+            continue
+        result.append(event)
+    return result
+
+
+def timeit(fn, **kwargs):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn(**kwargs)
+    return (time.perf_counter() - start) / REPEAT, result
+
+
+def main():
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    paths = sorted(glob.glob(EVENTS_GLOB))
+    start = time.perf_counter()
+    store = EventStore.from_files(paths)
+    load_time = time.perf_counter() - start
+    print(f"{store.size} events from {len(paths)} files, store built in {load_time * 1000:.1f} ms")
+
+    events = []
+    for path in paths:
+        for event in json.load(open(path, encoding="utf-8")):
+            event["start"], event["end"] = event_interval(event)
+            event["place"] = place_key(event["location"])
+            events.append(event)
+
+    print(f"{'query':32s} {'store us':>9} {'scan us':>8} {'results':>8}")
+    for label, kwargs in QUERIES:
+        store_time, result = timeit(store.search, **kwargs)
+        scan_time, _ = timeit(lambda **kw: scan(events, **kw), **kwargs)
+        print(f"{label:32s} {store_time * 1e6:>9.1f} {scan_time * 1e6:>8.1f} {len(result):>8}")
+
+
+if __name__ == "__main__":
+    main()
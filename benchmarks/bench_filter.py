@@ -0,0 +1,100 @@
+import os
+import sys
+import random
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from poi_store import POIStore
+
+AMENITIES = ["waste_disposal", "waste_basket", "recycling"]
+MATERIALS = ["glass", "paper", "plastic", "cans", "organic", "clothes", "batteries", "hazardous", "e-waste"]
+
+
+def make_features(n, seed=42):
+    """
+    Generate n synthetic ecopoint features around Lucca.
+
+    Args:
+        n (int): Number of features
+        seed (int): Random seed
+
+    Returns:
+        list: GeoJSON point features
+    """
+    rng = random.Random(seed)
+    features = []
+    for i in range(n):
+        features.append({
+            "type": "Feature",
+            "properties": {
+                "@id": f"node/{i}",
+                "amenity": rng.choice(AMENITIES),
+                "materials": rng.sample(MATERIALS, rng.randint(1, 4))
+            },
+            "geometry": {
+                "type": "Point",
+                "coordinates": [10.49 + rng.random() * 0.03, 43.83 + rng.random() * 0.02]
+            }
+        })
+    return features
+
+
+def legacy_filter(df, selected_amenities, selected_materials):
+    # Same logic that navigator.page1 ran before the index
+    amenities = df["properties"].apply(lambda x: x.get("amenity", "Sconosciuto")).unique()
+    filtered_df = df[df["properties"].apply(lambda x: x.get("amenity", "Sconosciuto") in selected_amenities)]
+    materials = sorted({mat for mats in filtered_df["properties"].apply(lambda x: x.get("materials")) for mat in mats})
+    filtered_df = filtered_df[filtered_df["properties"].apply(lambda x: any(mat in x.get("materials", []) for mat in selected_materials))]
+    return amenities, materials, len(filtered_df)
+
+
+def indexed_filter(store, selected_amenities, selected_materials):
+    amenities = store.amenities
+    mask = store.amenity_mask(selected_amenities)
+    materials = store.materials_in(mask)
+    mask &= store.material_mask(selected_materials)
+    return amenities, materials, int(np.count_nonzero(mask))
+
+
+def timeit(fn, *args, repeat=5):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    features = make_features(n)
+    selected_amenities = AMENITIES[:2]
+    selected_materials = ["glass", "batteries"]
+
+    df = pd.DataFrame([{
+        "latitude": f["geometry"]["coordinates"][1],
+        "longitude": f["geometry"]["coordinates"][0],
+        "properties": f["properties"]
+    } for f in features])
+
+    start = time.perf_counter()
+    store = POIStore.from_features(features)
+    build_time = time.perf_counter() - start
+
+    legacy_time, legacy_result = timeit(legacy_filter, df, selected_amenities, selected_materials)
+    indexed_time, indexed_result = timeit(indexed_filter, store, selected_amenities, selected_materials)
+    assert legacy_result[2] == indexed_result[2]
+    assert legacy_result[1] == indexed_result[1]
+
+    print(f"Synthetic ecopoints: {n}  (matching rows: {indexed_result[2]})")
+    print(f"Store + index build (once per load): {build_time * 1000:.1f} ms")
+    print(f"Legacy per-row .apply filter:        {legacy_time * 1000:.2f} ms")
+    print(f"Indexed bitmask filter:              {indexed_time * 1000:.2f} ms")
+    print(f"Speedup: {legacy_time / indexed_time:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from queue_state import QueueState
+
+SAMPLE_INTERVAL = 15  # secondi tra due letture dei sensori
+WARMUP = 60 * 60
+ETA = 10 * 60
+
+
+def simulate(queue, arrival_rate, service_rate, seconds, rng):
+    # Processo di nascita e morte con arrivi e servizi di Poisson (tassi in persone/minuto)
+    minutes = seconds / 60
+    arrivals = rng.poisson(arrival_rate * minutes)
+    served = rng.poisson(service_rate * minutes)
+    return np.maximum(queue + arrivals - served, 0)
+
+
+def timeit(fn, *args, repeat=20):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = np.random.default_rng(42)
+    ids = [f"node/{i}" for i in range(n)]
+    # Meta' dei POI con coda in crescita, meta' in svuotamento
+    service_rate = rng.uniform(0.5, 1.5, n)
+    arrival_rate = service_rate * rng.choice([0.5, 1.5], n)
+    queue = rng.integers(0, 10, n)
+
+    state = QueueState()
+    rows = state.register(ids)
+    t = 0.0
+    start = time.perf_counter()
+    while t < WARMUP:
+        queue = simulate(queue, arrival_rate, service_rate, SAMPLE_INTERVAL, rng)
+        t += SAMPLE_INTERVAL
+        state.update_many(zip(ids, queue, np.full(n, t)))
+    updates = n * WARMUP // SAMPLE_INTERVAL
+    update_time = time.perf_counter() - start
+
+    eta = np.full(n, float(ETA))
+    predict_time, (expected, _) = timeit(state.predict_wait, rows, eta, 1, t)
+    actual = queue.copy()
+    for _ in range(ETA // SAMPLE_INTERVAL):
+        actual = simulate(actual, arrival_rate, service_rate, SAMPLE_INTERVAL, rng)
+
+    print(f"POIs: {n}, {updates} observations in {update_time:.2f} s ({updates / update_time:,.0f}/s)")
+    print(f"Batch prediction for {n} POIs: {predict_time * 1e6:.0f} us")
+    print(f"Queue at ETA ({ETA // 60} min), mean absolute error:")
+    print(f"  current queue (static):  {np.abs(queue - actual).mean():.2f} people")
+    print(f"  EWMA forecast:           {np.abs(expected - actual).mean():.2f} people")
+
+    # Tassi stimati contro quelli veri della simulazione
+    default = 1.0
+    estimated_service = state.forecast.service_rate(rows)
+    estimated_arrival = state.forecast.arrival_rate(rows)
+    minutes = state.forecast.minutes_per_person(rows, default)
+    known = minutes != default
+    print(f"Service rate, estimated / true (median): {np.median(estimated_service / service_rate):.2f}")
+    print(f"Arrival rate, estimated / true (median): {np.median(estimated_arrival / arrival_rate):.2f}")
+    print(f"Minutes per person, median absolute error ({known.sum()}/{n} POIs estimated):")
+    print(f"  static {default:.1f} min/person:      {np.median(np.abs(default - 1 / service_rate)):.2f} min")
+    print(f"  estimated:               {np.median(np.abs(minutes - 1 / service_rate)):.2f} min")
+    # Quello che conta nella classifica: minuti di coda dei POI con gente in attesa
+    waiting = queue > 0
+    true_wait = queue[waiting] / service_rate[waiting]
+    print(f"Queue minutes now, mean absolute error ({waiting.sum()} POIs with a queue):")
+    print(f"  static {default:.1f} min/person:      {np.abs(queue[waiting] * default - true_wait).mean():.2f} min")
+    print(f"  estimated:               {np.abs(queue[waiting] * minutes[waiting] - true_wait).mean():.2f} min")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from stub_watsonx import start_stub_server, estimate_tokens
+
+# Gli endpoint vanno impostati prima di importare utils
+server, url = start_stub_server()
+os.environ["WATSONX_URL"] = url
+os.environ["IAM_URL"] = url + "/identity/token"
+
+import recycling_assistant
+from recycling_assistant import MAX_NEW_TOKENS
+from bin_index import get_bin_index
+
+ITEM_SETS = [
+    ["weird gadget"],
+    ["plastic water bottle", "beer can"],
+    ["styrofoam cup", "wine glass", "chips bag"],
+    ["broken umbrella", "phone charger", "paper cup", "plastic fork", "sushi tray"],
+]
+
+
+def timeit(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    recycling_data = json.load(open("data.json"))
+    bin_index = get_bin_index()
+    full_context = json.dumps(recycling_data)
+
+    print(f"Stub model: {url} (prefill {server.input_token_latency * 1000:.2f} ms/token, "
+          f"decode {server.output_token_latency * 1000:.0f} ms/token)")
+    print(f"{'items':>5} {'full tokens':>12} {'trimmed':>8} {'retrieval':>10} {'full s':>8} {'trimmed s':>10}")
+    for items in ITEM_SETS:
+        joined = ", ".join(items)
+        start = time.perf_counter()
+        trimmed_context = json.dumps(bin_index.relevant_context(items))
+        retrieval_time = time.perf_counter() - start
+
+        full_tokens = estimate_tokens(recycling_assistant.build_recycling_prompt(full_context, joined, "text"))
+        trimmed_tokens = estimate_tokens(recycling_assistant.build_recycling_prompt(trimmed_context, joined, "text"))
+        full_time = timeit(recycling_assistant.get_recycling_advice, full_context, joined, MAX_NEW_TOKENS, "text")
+        trimmed_time = timeit(recycling_assistant.get_recycling_advice, trimmed_context, joined, MAX_NEW_TOKENS, "text")
+        print(f"{len(items):>5} {full_tokens:>12} {trimmed_tokens:>8} {retrieval_time * 1000:>8.2f}ms "
+              f"{full_time:>8.3f} {trimmed_time:>10.3f}")
+
+    # Stesso contesto ridotto, risposta a blocchi di testo o JSON con chiavi brevi
+    print()
+    print(f"{'items':>5} {'format':>6} {'prompt tokens':>14} {'output tokens':>14} {'seconds':>8} {'cards':>6}")
+    for items in ITEM_SETS:
+        joined = ", ".join(items)
+        context = json.dumps(bin_index.relevant_context(items))
+        for response_format in ("text", "json"):
+            prompt_tokens = estimate_tokens(recycling_assistant.build_recycling_prompt(context, joined, response_format))
+            output = recycling_assistant.get_recycling_advice(context, joined, MAX_NEW_TOKENS, response_format)
+            cards = [advice for advice, error in recycling_assistant.iter_advice([output], response_format) if error is None]
+            seconds = timeit(recycling_assistant.get_recycling_advice, context, joined, MAX_NEW_TOKENS, response_format)
+            print(f"{len(items):>5} {response_format:>6} {prompt_tokens:>14} {estimate_tokens(output):>14} "
+                  f"{seconds:>8.3f} {len(cards):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from routing import RoadGraph, graphhopper_route
+from street_index import STREETS_FILE
+
+# Centro storico di Lucca, usato per il grafo sintetico e per i punti casuali
+CENTER = (43.843, 10.503)
+SIZE = 0.02  # gradi
+
+
+def make_grid_streets(path, n=60, seed=7):
+    """
+    Write a synthetic n x n street grid around Lucca as an OSM-like GeoJSON.
+
+    Args:
+        path (str): Output file
+        n (int): Streets per direction
+        seed (int): Random seed
+    """
+    rng = random.Random(seed)
+    lat0, lon0 = CENTER[0] - SIZE / 2, CENTER[1] - SIZE / 2
+    step = SIZE / (n - 1)
+    features = []
+    for i in range(n):
+        for horizontal in (True, False):
+            coordinates = []
+            for j in range(n):
+                lat = lat0 + (i if horizontal else j) * step
+                lon = lon0 + (j if horizontal else i) * step
+                coordinates.append([lon, lat])
+            features.append({
+                "type": "Feature",
+                "properties": {"name": f"Via {'Est' if horizontal else 'Nord'} {i}",
+                               "highway": rng.choice(["residential", "residential", "pedestrian", "footway", "tertiary"])},
+                "geometry": {"type": "LineString", "coordinates": coordinates}
+            })
+    with open(path, 'w') as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def random_points(count, seed=1):
+    rng = random.Random(seed)
+    return [((CENTER[0] + (rng.random() - 0.5) * SIZE * 0.9, CENTER[1] + (rng.random() - 0.5) * SIZE * 0.9),
+             (CENTER[0] + (rng.random() - 0.5) * SIZE * 0.9, CENTER[1] + (rng.random() - 0.5) * SIZE * 0.9))
+            for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local A* routing latency, optionally against the GraphHopper API")
+    parser.add_argument("queries", type=int, nargs="?", default=200, help="Random origin/destination pairs")
+    parser.add_argument("--http", action="store_true",
+                        help="Also time the GraphHopper API on the same points (needs GRAPHHOPPER_API_KEY)")
+    args = parser.parse_args()
+    queries = args.queries
+    path = STREETS_FILE
+    if not os.path.exists(path):
+        path = os.path.join(tempfile.mkdtemp(), "grid.geojson")
+        make_grid_streets(path)
+        print(f"{STREETS_FILE} not found, using a synthetic street grid")
+
+    start = time.perf_counter()
+    graph = RoadGraph.from_geojson(path)
+    print(f"Graph: {len(graph)} nodes, loaded in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    pairs = random_points(queries)
+    for profile in ("foot", "bike", "car"):
+        timings = []
+        for a, b in pairs:
+            start = time.perf_counter()
+            graph.route(a, b, profile)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        print(f"local {profile:5s}: median {timings[len(timings) // 2] * 1000:.1f} ms, "
+              f"p95 {timings[int(len(timings) * 0.95)] * 1000:.1f} ms over {queries} queries")
+
+    if os.getenv("GRAPHHOPPER_API_KEY") and args.http:
+        timings = []
+        for a, b in pairs[:10]:
+            start = time.perf_counter()
+            graphhopper_route(a, b, "foot")
+            timings.append(time.perf_counter() - start)
+            time.sleep(1)  # limite di richieste del piano gratuito
+        timings.sort()
+        print(f"GraphHopper HTTP foot: median {timings[len(timings) // 2] * 1000:.1f} ms over {len(timings)} queries")
+    else:
+        print("Pass --http (with GRAPHHOPPER_API_KEY set) to time the GraphHopper API on the same points")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from bin_index import get_bin_index
+
+# Oggetto -> bidone atteso, o None se la decisione va lasciata al modello
+CASES = {
+    "glass bottle": "green",
+    "plastic bottle": "yellow",
+    "aluminum can": "yellow",
+    "banana peel": "brown",
+    "egg shells": "brown",
+    "pizza box": "brown",
+    "cardboard box": "blue",
+    "newspaper": "blue",
+    "plastic bag": "yellow",
+    "paper bag": "blue",
+    "dirty plastic plate": "yellow",
+    "spray can": "yellow",
+    "razor": "grey",
+    # Parole negate nella voce: "glass bottles without caps", "razors (non-electric)"
+    "bottle cap": None,
+    "glass bottle cap": None,
+    "electric razor": None,
+    "plastic coated flyer": None,
+    # Materiale diverso da quello della voce: "plastic plates including dirty ones"
+    "dirty paper plate": None,
+    "paper plate": None,
+    "paper cup": None,
+    # Parole che nessuna voce spiega: il qualificativo puo' cambiare il bidone
+    "clean pizza box": None,
+    "greasy pizza box": None,
+    "glass wine bottle": None,
+}
+
+
+def main():
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    bin_index = get_bin_index()
+    failures = 0
+    start = time.perf_counter()
+    for item, expected in CASES.items():
+        match = bin_index._resolve(item)
+        got = match[0] if match else None
+        ok = got == expected
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {item:22s} expected {str(expected):8s} got {str(got):8s} "
+              f"{match[1] if match else ''}")
+    elapsed = (time.perf_counter() - start) / len(CASES)
+    print(f"{len(CASES) - failures}/{len(CASES)} cases, {elapsed * 1000:.2f} ms per uncached lookup")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
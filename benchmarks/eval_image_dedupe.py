@@ -0,0 +1,65 @@
+import io
+import os
+import sys
+import glob
+import time
+import itertools
+from PIL import Image, ImageEnhance
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from image_cache import image_hash, hamming, HASH_FUNCTIONS, IMAGE_HASH_THRESHOLD
+
+TEST_IMAGES = os.path.join(os.path.dirname(__file__), "..", "images", "test-images")
+
+
+def encode(image, quality=90):
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def variants(image):
+    # Scatti "quasi uguali": ricompressione, ridimensionamento, luce, piccolo ritaglio o spostamento
+    width, height = image.size
+    yield "jpeg q60", encode(image, 60)
+    yield "resize 50%", encode(image.resize((width // 2, height // 2)))
+    yield "brighter 15%", encode(ImageEnhance.Brightness(image).enhance(1.15))
+    yield "crop 3%", encode(image.crop((int(width * 0.03), int(height * 0.03), width, height)))
+    yield "shift 2%", encode(image.crop((int(width * 0.02), 0, width, height - int(height * 0.02))))
+
+
+def main():
+    threshold = int(sys.argv[1]) if len(sys.argv) > 1 else IMAGE_HASH_THRESHOLD
+    paths = sorted(glob.glob(os.path.join(TEST_IMAGES, "*")))
+    originals = {os.path.basename(path): open(path, "rb").read() for path in paths}
+
+    for method in HASH_FUNCTIONS:
+        hashes = {}
+        start = time.perf_counter()
+        for name, data in originals.items():
+            hashes[name] = image_hash(data, method)
+        hash_time = (time.perf_counter() - start) / len(originals)
+
+        print(f"== {method} (threshold {threshold}, {hash_time * 1000:.2f} ms per image)")
+        missed = 0
+        total = 0
+        for name, data in originals.items():
+            with Image.open(io.BytesIO(data)) as image:
+                image.load()
+                for label, variant in variants(image):
+                    distance = hamming(hashes[name], image_hash(variant, method))
+                    total += 1
+                    missed += distance > threshold
+                    print(f"  {name:20s} {label:14s} distance {distance:2d} {'MISS' if distance > threshold else 'hit'}")
+
+        false_matches = 0
+        pairs = list(itertools.combinations(originals, 2))
+        closest = min(hamming(hashes[a], hashes[b]) for a, b in pairs)
+        for a, b in pairs:
+            false_matches += hamming(hashes[a], hashes[b]) <= threshold
+        print(f"  near-duplicates recognized: {total - missed}/{total}")
+        print(f"  different images matched:  {false_matches}/{len(pairs)} (closest pair at distance {closest})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import io
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from PIL import Image
+from image_preprocess import prepare_image, IMAGE_MAX_EDGE, IMAGE_JPEG_QUALITY
+
+TEST_IMAGES = os.path.join(os.path.dirname(__file__), "..", "images", "test-images")
+# Parola che deve comparire nella risposta del modello di visione per ogni immagine
+EXPECTED = {
+    "banan.jpg": "banana",
+    "eggshell.jpg": "egg",
+    "orangepeels.jpg": "orange",
+    "plasticbtl.jpg": "bottle",
+    "tunacans.jpg": "can",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Payload size and preprocessing time on images/test-images")
+    parser.add_argument("--max-edge", type=int, default=IMAGE_MAX_EDGE)
+    parser.add_argument("--quality", type=int, default=IMAGE_JPEG_QUALITY)
+    parser.add_argument("--vision", action="store_true",
+                        help="Also call the vision model with the original and the preprocessed image "
+                             "(needs API_KEY/PROJECT_ID, or WATSONX_URL/IAM_URL pointing at a server)")
+    args = parser.parse_args()
+
+    if args.vision:
+        import recycling_assistant
+
+    total_original = 0
+    total_sent = 0
+    correct = {"original": 0, "preprocessed": 0}
+    grown = []
+    too_large = []
+    for path in sorted(glob.glob(os.path.join(TEST_IMAGES, "*"))):
+        name = os.path.basename(path)
+        image_bytes = open(path, "rb").read()
+        prepare_image(image_bytes, args.max_edge, args.quality)  # riscaldamento
+        _, stats = prepare_image(image_bytes, args.max_edge, args.quality)
+        total_original += stats["original_bytes"]
+        total_sent += stats["sent_bytes"]
+        with Image.open(path) as image:
+            fits = max(image.size) <= args.max_edge
+        # Solo le immagini gia' entro max_edge non devono crescere: le altre vanno comunque ridotte
+        if fits and stats["sent_bytes"] > stats["original_bytes"]:
+            grown.append(name)
+        if max(stats["size"]) > args.max_edge:
+            too_large.append(name)
+        sent = "original" if stats["quality"] is None else f"q{stats['quality']}"
+        print(f"{name:20s} {stats['original_bytes']:>8} -> {stats['sent_bytes']:>8} bytes "
+              f"{stats['size'][0]:>5}x{stats['size'][1]:<5} {sent:>8} {stats['mime']:10s} {stats['elapsed_ms']:6.1f} ms")
+
+        if args.vision and name in EXPECTED:
+            for label, preprocess in (("original", False), ("preprocessed", True)):
+                start = time.perf_counter()
+                answer = recycling_assistant.analyze_image(io.BytesIO(image_bytes), preprocess=preprocess)
+                ok = EXPECTED[name] in answer.lower()
+                correct[label] += ok
+                print(f"    {label:12s} {time.perf_counter() - start:5.2f} s {'ok ' if ok else 'BAD'} {answer.strip()[:80]}")
+
+    print(f"Total: {total_original} -> {total_sent} bytes ({100 * (1 - total_sent / total_original):.0f}% saved)")
+    if args.vision:
+        print(f"Expected item found: original {correct['original']}/{len(EXPECTED)}, "
+              f"preprocessed {correct['preprocessed']}/{len(EXPECTED)}")
+
+    if grown:
+        print(f"FAIL: preprocessing made these images bigger although they fit max_edge: {', '.join(grown)}")
+    if too_large:
+        print(f"FAIL: sent with an edge above {args.max_edge} px: {', '.join(too_large)}")
+    if grown or too_large:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
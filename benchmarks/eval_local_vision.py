@@ -0,0 +1,67 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from local_vision import (get_local_classifier, WASTE_CLASSES, LOCAL_VISION_MODEL, LOCAL_VISION_LABELS,
+                          LOCAL_VISION_THRESHOLD)
+from bin_index import get_bin_index
+from eval_image_preprocess import TEST_IMAGES, EXPECTED
+
+THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy and latency of the local vision tier on images/test-images")
+    parser.add_argument("--model", default=LOCAL_VISION_MODEL)
+    parser.add_argument("--labels", default=LOCAL_VISION_LABELS)
+    parser.add_argument("--threshold", type=float, default=LOCAL_VISION_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    # Ogni oggetto riconosciuto localmente deve avere un bidone in data.json
+    bin_index = get_bin_index()
+    for item in sorted(set(WASTE_CLASSES.values())):
+        match = bin_index.resolve(item)
+        if match is None:
+            print(f"WARNING: \"{item}\" does not resolve to a bin in data.json")
+
+    classifier = get_local_classifier(args.model, args.labels)
+    if classifier is None:
+        print(f"Model or labels not found ({args.model}, {args.labels}).\n"
+              f"Download an ImageNet ONNX classifier (e.g. mobilenetv2-12.onnx and synset.txt from the ONNX model zoo) "
+              f"into models/, or set LOCAL_VISION_MODEL and LOCAL_VISION_LABELS.")
+        sys.exit(1)
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(TEST_IMAGES, "*"))):
+        name = os.path.basename(path)
+        if name not in EXPECTED:
+            continue
+        image_bytes = open(path, "rb").read()
+        classifier.classify(image_bytes)  # riscaldamento
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            prediction = classifier.classify(image_bytes)
+            times.append(time.perf_counter() - start)
+        ok = prediction["item"] is not None and EXPECTED[name] in prediction["item"]
+        results.append((prediction["confidence"], ok))
+        answer = "local" if prediction["item"] is not None and prediction["confidence"] >= args.threshold else "remote"
+        print(f"{name:18s} {prediction['label'][:20]:20s} -> {str(prediction['item']):15s} "
+              f"{prediction['confidence']:.2f} {'ok ' if ok else 'BAD'} {answer:6s} "
+              f"median {np.median(times) * 1000:6.1f} ms")
+
+    print()
+    print(f"{'threshold':>9} {'local':>6} {'correct':>8} {'remote':>7}")
+    for threshold in sorted(set(THRESHOLDS) | {args.threshold}):
+        answered = [ok for confidence, ok in results if confidence >= threshold]
+        print(f"{threshold:>9g} {len(answered):>6} {sum(answered):>8} {len(results) - len(answered):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Latenza simulata: costo fisso + prefill per token di input + decodifica per token generato
+BASE_LATENCY = 0.05
+INPUT_TOKEN_LATENCY = 0.0002
+OUTPUT_TOKEN_LATENCY = 0.02
+# Stima grossolana: ~4 caratteri per token
+CHARS_PER_TOKEN = 4
+CHAT_ANSWER = ("Lucca Comics & Games 2024 ti aspetta con fumetti, giochi, cosplay e concerti in ogni angolo "
+               "delle mura: non perderti il Music Main Stage e le mostre a Palazzo Ducale! 🎉")
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def advice_block(item):
+    return (f"- Item Name: {item}\n"
+            f"- Correct Bin: grey\n"
+            f"- Preparation Required: None\n"
+            f"- Reason: {item} is not listed in the guidelines, so it goes with unsorted waste\n"
+            f"- Special Notes: Check with the collection center if unsure")
+
+
+def advice_object(item):
+    return {"n": item, "b": "grey", "r": f"{item} is not listed in the guidelines, so it goes with unsorted waste",
+            "s": "Check with the collection center if unsure"}
+
+
+def generated_text(prompt):
+    # Un blocco (o un oggetto JSON) per ogni oggetto elencato nel prompt di get_recycling_advice
+    match = re.search(r"analyze these items: (.*?) Context", prompt, re.S)
+    items = [item.strip() for item in match.group(1).split(",") if item.strip()] if match else ["item"]
+    if "JSON array" in prompt:
+        return json.dumps([advice_object(item) for item in items])
+    return "\n---------\n".join(advice_block(item) for item in items)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the IAM token, text generation and chat endpoints with canned
+    data, including their server-sent-event (_stream) variants.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length).decode("utf-8")
+
+    def _simulate(self, prompt, output):
+        server = self.server
+        time.sleep(server.base_latency
+                   + server.input_token_latency * estimate_tokens(prompt)
+                   + server.output_token_latency * estimate_tokens(output))
+
+    def _send_events(self, prompt, output, event):
+        # Prefill, poi un evento per parola al ritmo di decodifica
+        server = self.server
+        time.sleep(server.base_latency + server.input_token_latency * estimate_tokens(prompt))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.end_headers()
+        for chunk in re.findall(r"\S+\s*", output):
+            time.sleep(server.output_token_latency * estimate_tokens(chunk))
+            self.wfile.write(f"id: 1\nevent: message\ndata: {json.dumps(event(chunk))}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def do_POST(self):
+        raw = self._read_body()
+        path = self.path.split("?")[0]
+        if path == "/identity/token":
+            now = int(time.time())
+            self._send_json({"access_token": "stub-token", "expires_in": 3600, "expiration": now + 3600})
+        elif path == "/ml/v1/text/generation":
+            prompt = json.loads(raw)["input"]
+            output = generated_text(prompt)
+            self._simulate(prompt, output)
+            self._send_json({"results": [{"generated_text": output, "input_token_count": estimate_tokens(prompt)}]})
+        elif path == "/ml/v1/text/chat":
+            prompt = raw
+            output = CHAT_ANSWER
+            self._simulate(prompt, output)
+            self._send_json({"choices": [{"message": {"role": "assistant", "content": output}}]})
+        elif path == "/ml/v1/text/generation_stream":
+            prompt = json.loads(raw)["input"]
+            self._send_events(prompt, generated_text(prompt),
+                              lambda chunk: {"results": [{"generated_text": chunk}]})
+        elif path == "/ml/v1/text/chat_stream":
+            self._send_events(raw, CHAT_ANSWER,
+                              lambda chunk: {"choices": [{"index": 0, "delta": {"role": "assistant", "content": chunk}}]})
+        else:
+            self.send_error(404)
+
+
+def start_stub_server(port=0, base_latency=BASE_LATENCY, input_token_latency=INPUT_TOKEN_LATENCY,
+                      output_token_latency=OUTPUT_TOKEN_LATENCY):
+    """
+    Start the stub on a background thread.
+
+    Returns:
+        tuple: (server, base URL)
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    server.base_latency = base_latency
+    server.input_token_latency = input_token_latency
+    server.output_token_latency = output_token_latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for watsonx.ai and IBM IAM. "
+                                                 "Point the app at it with WATSONX_URL=<url> IAM_URL=<url>/identity/token")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port)
+    print(f"Stub watsonx server on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
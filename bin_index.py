@@ -0,0 +1,329 @@
+import os
+import re
+import json
+import math
+import difflib
+import threading
+import unicodedata
+from functools import lru_cache
+
+RECYCLING_DATA_FILE = 'data.json'
+# Distacco minimo (quota pesata IDF delle parole dell'oggetto) dal miglior bidone alternativo
+MIN_MARGIN = 0.25
+FUZZY_CUTOFF = 0.85
+# Bidoni passati al modello per ogni oggetto, e parametri BM25
+TOP_BINS = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Sempre nel contesto: dove finisce cio' che non e' nelle linee guida
+FALLBACK_BINS = ("grey",)
+
+STOPWORDS = {
+    "a", "an", "the", "of", "and", "or", "with", "without", "for", "in", "on", "to", "from",
+    "including", "etc", "eg", "some", "small", "large", "big", "empty", "used", "only",
+    "both", "its", "their", "non", "general", "quantities", "quantity", "piece", "pieces",
+    "one", "two", "three", "four", "five", "six", "several", "multiple", "pair", "pairs", "few"
+}
+# Una parola negata non descrive l'oggetto: "glass bottles without caps" non parla di tappi
+NEGATIONS = ("without", "excluding", "except", "non", "not", "no")
+NEGATION_PATTERN = re.compile(r"\b(?:" + "|".join(NEGATIONS) + r")\b[\s-]*[a-z]*")
+# Materiali: se l'oggetto ne nomina uno, la voce di data.json deve nominare lo stesso
+MATERIALS = {"paper", "plastic", "glass", "metal", "aluminum", "steel"}
+# Nomi comuni che in data.json compaiono solo come categoria generica
+SYNONYMS = {
+    "banana": "fruit", "apple": "fruit", "orange": "fruit", "lemon": "fruit", "pear": "fruit",
+    "peach": "fruit", "melon": "fruit", "watermelon": "fruit", "grape": "fruit", "tangerine": "fruit",
+    "mandarin": "fruit", "kiwi": "fruit", "strawberry": "fruit",
+    "skin": "peel", "rind": "peel", "peeling": "peel", "core": "scrap",
+    "tin": "can", "soda": "beverage", "drink": "beverage", "juice": "beverage",
+    "serviette": "napkin", "pill": "medicine", "drug": "medicine",
+    "styrofoam": "polystyrene", "tinfoil": "aluminum", "aluminium": "aluminum",
+    "tshirt": "clothing", "shirt": "clothing", "jacket": "clothing", "trouser": "clothing",
+    "jean": "clothing", "mobile": "cell",
+}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def singular(token):
+    """Crude English plural folding, applied the same way to data.json and to queries."""
+    if len(token) <= 3 or token.endswith(("ss", "us", "is")):
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith("ves"):
+        return token[:-3] + "f"
+    if token.endswith(("ses", "xes", "ches", "shes", "oes")):
+        return token[:-2]
+    if token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Lowercase, accent-free, singular, stopword-free tokens of a text, without negated words."""
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+    text = NEGATION_PATTERN.sub(" ", text)
+    tokens = []
+    for word in re.findall(r"[a-z]+", text):
+        if word in STOPWORDS or len(word) == 1:
+            continue
+        tokens.append(SYNONYMS.get(singular(word), singular(word)))
+    return tokens
+
+
+def _split_top_level(text):
+    # Divide sulle virgole fuori dalle parentesi
+    parts, depth, current = [], 0, ""
+    for char in text:
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def entry_variants(entry):
+    """
+    Phrasings of an accepted_items entry.
+
+    "fruit (leftovers, peels)" gives "fruit leftovers, peels", "fruit",
+    "fruit leftovers" and "fruit peels"; the parts of top-level comma
+    lists such as "egg shells, mussel and clam shells" are phrasings too.
+    """
+    variants = [entry.replace("(", " ").replace(")", " ")]
+    for part in _split_top_level(entry):
+        variants.append(part.replace("(", " ").replace(")", " "))
+        match = re.match(r"^(.*?)\((.*?)\)(.*)$", part)
+        if match:
+            head = (match.group(1) + match.group(3)).strip()
+            variants.append(head)
+            for detail in re.split(r",|/", match.group(2)):
+                variants.append(head + " " + detail)
+    return variants
+
+
+class BinIndex:
+    """
+    Precompiled lookup from item names to the bins of data.json.
+
+    Every accepted item is indexed by its normalized token set. An item
+    resolves to a bin when its tokens match a phrasing of an entry
+    exactly, or when one entry contains all of its tokens and no other
+    bin covers nearly as many of them (IDF-weighted). An item with a word
+    that no entry of the bin explains ("clean pizza box") is left to the
+    language model.
+    """
+
+    def __init__(self, recycling_data, min_margin=MIN_MARGIN):
+        self.recycling_data = recycling_data
+        self.min_margin = min_margin
+        # (bin, voce originale, insieme di token) per ogni formulazione
+        self.entries = []
+        exact = {}
+        document_frequency = {}
+        compounds = {}
+        for bin_key, category in recycling_data.items():
+            for entry in category.get("accepted_items", []):
+                for variant in entry_variants(entry):
+                    tokens = frozenset(tokenize(variant))
+                    if not tokens:
+                        continue
+                    self.entries.append((bin_key, entry, tokens))
+                    exact.setdefault(tokens, set()).add(bin_key)
+                    for token in tokens:
+                        document_frequency[token] = document_frequency.get(token, 0) + 1
+                    words = tokenize(variant)
+                    for first, second in zip(words, words[1:]):
+                        compounds[singular(first + second)] = (first, second)
+        # Solo le formulazioni esatte che portano a un unico bidone
+        self.exact = {tokens: next(iter(bins)) for tokens, bins in exact.items() if len(bins) == 1}
+        n = len(self.entries)
+        self.weights = {token: math.log(1 + n / df) for token, df in document_frequency.items()}
+        self.compounds = {word: parts for word, parts in compounds.items() if word not in self.weights}
+        self.vocabulary = sorted(self.weights)
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+        self._query_tokens = lru_cache(maxsize=4096)(self._query_tokens)
+
+        # BM25: un documento per bidone (nome, descrizione e oggetti accettati)
+        self.bin_keys = list(recycling_data)
+        self.entry_tokens = {}
+        self.bin_terms = []
+        for bin_key in self.bin_keys:
+            category = recycling_data[bin_key]
+            for entry in category.get("accepted_items", []):
+                self.entry_tokens[entry] = frozenset(tokenize(entry))
+            text = " ".join([category.get("name", ""), category.get("description", "")] + category.get("accepted_items", []))
+            terms = {}
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0) + 1
+            self.bin_terms.append(terms)
+        lengths = [sum(terms.values()) for terms in self.bin_terms]
+        self.bin_lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        bin_frequency = {}
+        for terms in self.bin_terms:
+            for token in terms:
+                bin_frequency[token] = bin_frequency.get(token, 0) + 1
+        n_bins = len(self.bin_keys)
+        self.bin_idf = {token: math.log(1 + (n_bins - df + 0.5) / (df + 0.5)) for token, df in bin_frequency.items()}
+
+    def _query_tokens(self, item):
+        tokens = []
+        for token in tokenize(item):
+            if token in self.weights:
+                tokens.append(token)
+            elif token in self.compounds:
+                tokens.extend(self.compounds[token])
+            else:
+                close = difflib.get_close_matches(token, self.vocabulary, n=1, cutoff=FUZZY_CUTOFF) if len(token) > 3 else []
+                tokens.append(close[0] if close else token)
+        return frozenset(tokens)
+
+    def _resolve(self, item):
+        """
+        Bin of a single item, if the index is confident about it.
+
+        Args:
+            item (str): Item name, e.g. "glass bottle"
+
+        Returns:
+            tuple: (bin key, matched data.json entry, score in [0, 1]), or None
+        """
+        tokens = self._query_tokens(item)
+        if not tokens:
+            return None
+        bin_key = self.exact.get(tokens)
+        if bin_key is not None:
+            entry = next(entry for key, entry, entry_tokens in self.entries if key == bin_key and entry_tokens == tokens)
+            return bin_key, entry, 1.0
+
+        if not tokens <= self.weights.keys():
+            # Parola assente da data.json (es. "wine" in "glass wine bottle"): decide il modello
+            return None
+        total = sum(self.weights[token] for token in tokens)
+        materials = tokens & MATERIALS
+        best = {}
+        for key, entry, entry_tokens in self.entries:
+            common = tokens & entry_tokens
+            if not common or not materials <= entry_tokens:
+                # "paper plate" non e' "plastic plates including dirty ones"
+                continue
+            coverage = sum(self.weights[token] for token in common) / total
+            specificity = len(common) / len(entry_tokens)
+            if key not in best or (coverage, specificity) > best[key][:2]:
+                best[key] = (coverage, specificity, entry, entry_tokens)
+        if not best:
+            return None
+        ranking = sorted(best.items(), key=lambda kv: kv[1][:2], reverse=True)
+        bin_key, (coverage, _, entry, entry_tokens) = ranking[0]
+        runner_up = ranking[1][1][0] if len(ranking) > 1 else 0.0
+        # Ogni parola dell'oggetto deve comparire nella voce: "clean pizza box" non e' "pizza boxes soiled with food"
+        if not tokens <= entry_tokens or coverage - runner_up < self.min_margin:
+            return None
+        return bin_key, entry, coverage
+
+    def rank_bins(self, item, k=TOP_BINS):
+        """
+        Bins most relevant to an item, by BM25 over the bin documents.
+
+        Returns:
+            list: Up to k bin keys, best first (only bins sharing a word with the item)
+        """
+        tokens = self._query_tokens(item)
+        scores = []
+        for bin_key, terms, length in zip(self.bin_keys, self.bin_terms, self.bin_lengths):
+            score = 0.0
+            for token in tokens:
+                tf = terms.get(token, 0)
+                if tf:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / self.average_length)
+                    score += self.bin_idf[token] * tf * (BM25_K1 + 1) / (tf + norm)
+            if score > 0:
+                scores.append((score, bin_key))
+        scores.sort(reverse=True)
+        return [bin_key for _, bin_key in scores[:k]]
+
+    def relevant_context(self, items, k=TOP_BINS):
+        """
+        Subset of the guidelines relevant to a list of items, for the prompt.
+
+        Keeps the top k bins of every item plus FALLBACK_BINS; within each
+        bin only the accepted items sharing a word with one of the items
+        are listed.
+
+        Args:
+            items (list): Item names
+            k (int): Bins kept per item
+
+        Returns:
+            dict: Same layout as data.json
+        """
+        query_tokens = set()
+        selected = []
+        for item in items:
+            query_tokens |= self._query_tokens(item)
+            for bin_key in self.rank_bins(item, k):
+                if bin_key not in selected:
+                    selected.append(bin_key)
+        for bin_key in FALLBACK_BINS:
+            if bin_key in self.recycling_data and bin_key not in selected:
+                selected.append(bin_key)
+
+        context = {}
+        for bin_key in selected:
+            category = self.recycling_data[bin_key]
+            matching = [entry for entry in category.get("accepted_items", []) if query_tokens & self.entry_tokens[entry]]
+            context[bin_key] = {
+                "name": category.get("name", ""),
+                "description": category.get("description", ""),
+                "accepted_items": matching
+            }
+        return context
+
+    def advice(self, item):
+        """
+        Recycling advice for an item, in the format of the model responses.
+
+        Returns:
+            dict: Card fields ("Item Name", "Correct Bin", ...), or None if
+                the item could not be resolved with confidence
+        """
+        match = self.resolve(item.strip().lower())
+        if match is None:
+            return None
+        bin_key, entry, _ = match
+        category = self.recycling_data[bin_key]
+        return {
+            "Item Name": item.strip().capitalize(),
+            "Correct Bin": bin_key,
+            "Bin Label": category["name"],
+            "Preparation Required": "None",
+            "Reason": f"\"{entry}\" go in the {category['name']} bin ({category['description']})",
+        }
+
+
+def split_items(identified_items):
+    """Items of the comma-separated list returned by the vision model."""
+    return [item.strip(" .\"'") for item in identified_items.split(",") if item.strip(" .\"'")]
+
+
+def get_bin_index(path=RECYCLING_DATA_FILE):
+    """
+    Return the BinIndex of a recycling guidelines file, built once per process.
+
+    The index is rebuilt only when the file modification time changes.
+    """
+    mtime = os.path.getmtime(path)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path) as f:
+                cached = (mtime, BinIndex(json.load(f)))
+            _indexes[path] = cached
+        return cached[1]
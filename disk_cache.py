@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+
+
+class DiskCache:
+    """
+    Small persistent key/value cache backed by SQLite.
+
+    Values are stored as JSON with an expiry time. When the cache grows
+    past max_entries, the least recently used entries are evicted. One
+    SQLite file can hold several caches, one table per namespace.
+    """
+
+    def __init__(self, namespace, max_entries=10000, ttl=None, path=None):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path or os.path.join(CACHE_DIR, "cache.db")
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f'''CREATE TABLE IF NOT EXISTS "{namespace}" (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL,
+            last_used REAL NOT NULL
+        )''')
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{namespace}_last_used" ON "{namespace}" (last_used)')
+
+    def get(self, key):
+        """
+        Look up a key.
+
+        Args:
+            key (str): The key
+
+        Returns:
+            tuple: (True, value) on a hit, (False, None) on a miss or an expired entry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, expires_at FROM "{self.namespace}" WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return False, None
+            value, expires_at = row
+            if expires_at is not None and expires_at < now:
+                self._conn.execute(f'DELETE FROM "{self.namespace}" WHERE key = ?', (key,))
+                return False, None
+            self._conn.execute(f'UPDATE "{self.namespace}" SET last_used = ? WHERE key = ?', (now, key))
+        return True, json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a JSON-serializable value.
+
+        Args:
+            key (str): The key
+            value: The value
+            ttl (float): Time to live in seconds, defaults to the cache TTL
+        """
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl is not None else None
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO "{self.namespace}" (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), expires_at, now))
+            count = self._conn.execute(f'SELECT COUNT(*) FROM "{self.namespace}"').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    f'DELETE FROM "{self.namespace}" WHERE key IN '
+                    f'(SELECT key FROM "{self.namespace}" ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM "{self.namespace}"').fetchone()[0]
@@ -1,9 +1,16 @@
+import re
+import json
 import streamlit as st
-import requests
+from datetime import datetime
+import http_client
 import utils
+from event_store import get_event_store
 
 USER_AVATAR = "👤"
 BOT_AVATAR = "🤖"
+# Eventi del programma inviati al modello per ogni domanda
+EVENT_CONTEXT_SIZE = 15
+MONTHS = {"novembre": 11, "nov": 11, "ottobre": 10, "ott": 10}
 SYSTEM_PROMPT = """
 Assume the role of an Italian Virtual Assistant for Lucca Comics, a renowned annual event.
 Your task is to provide informative yet entertaining responses to user queries about the event's programs.
@@ -11,21 +18,66 @@ Your answers should be in Italian and reflect the lively and unique atmosphere o
 The first question is, "What are the main programs happening at Lucca Comics this year?"
 Respond with concise, witty sentences that capture the essence of the event.
 Remember, your goal is to inform and entertain simultaneously. Add a relevant emoji to your answer.
-If asked about Cristina D'avena concert, here's the information:
-        "date": "03/11/2024",
-        "title": "Cristina D’Avena – Parole e Magia",
-        "location": "#MusicMainStage",
-        "start_time": "18:30",
-        "end_time": "20:00",
-        "warning": "Evento su prenotazione, prenota dal 22/10/2024"
-
-        "date": "03/11/2024",
-        "title": "Firmacopie Cristina D'Avena",
-        "location": "#Paladediche-EXCaffetteriaPalazzoDucaleDiLucca",
-        "start_time": "15:30",
-        "end_time": "17:00",
-        "warning": null
+Use only the events from the festival program listed below the question to give dates, times and places.
+If the program does not contain the answer, say so instead of guessing.
 """
+
+
+def parse_when(text, program_dates):
+    """
+    Day and time mentioned in a question ("3 novembre alle 18:30", "02/11", "alle 21").
+
+    Returns:
+        tuple: (list of "dd/mm/yyyy" days, (hour, minute) or None); without an
+            explicit day, today if it is a program day, otherwise every program day
+    """
+    year = program_dates[0][-4:] if program_dates else str(datetime.now().year)
+    days = []
+    for day, month in re.findall(r"\b(\d{1,2})/(\d{1,2})(?:/\d{2,4})?\b", text):
+        days.append(f"{int(day):02d}/{int(month):02d}/{year}")
+    for day, month in re.findall(r"\b(\d{1,2})\s+(" + "|".join(MONTHS) + r")\b", text.lower()):
+        days.append(f"{int(day):02d}/{MONTHS[month]:02d}/{year}")
+    match = re.search(r"\b(?:alle|all'|ore|at)\s*(\d{1,2})(?:[:.](\d{2}))?\b", text.lower()) \
+        or re.search(r"\b(\d{1,2})[:.](\d{2})\b", text)
+    when = (int(match.group(1)), int(match.group(2) or 0)) if match and int(match.group(1)) < 24 else None
+    if not days:
+        today = datetime.now().strftime("%d/%m/%Y")
+        days = [today] if today in program_dates else list(program_dates)
+    return [day for day in dict.fromkeys(days) if day in program_dates], when
+
+
+def program_context(question):
+    """
+    Events of the program related to a question: title or location words,
+    and the events running at the day and time it mentions.
+    """
+    store = get_event_store()
+    days, when = parse_when(question, store.dates())
+    times = [datetime.strptime(day, "%d/%m/%Y").replace(hour=when[0], minute=when[1]) for day in days] if when else []
+    # Prima gli eventi che corrispondono sia alle parole sia all'orario
+    events = []
+    for at in times:
+        events.extend(store.search(text=question, at=at, match_any=True, limit=EVENT_CONTEXT_SIZE))
+    events.extend(store.search(text=question, match_any=True, limit=EVENT_CONTEXT_SIZE))
+    for at in times:
+        events.extend(store.running_at(at, limit=EVENT_CONTEXT_SIZE))
+    unique = {(event["date"], event["title"], event["start_time"]): event for event in events}
+    return list(unique.values())[:EVENT_CONTEXT_SIZE]
+
+
+def stream_chat(body):
+    """Send a chat request to the streaming endpoint and yield the answer text as it arrives."""
+    url = f"{utils.WATSONX_URL}/ml/v1/text/chat_stream?version=2023-05-29"
+    headers = {
+        "Accept": "text/event-stream",
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {utils.get_api_token()}"
+    }
+    for event in http_client.stream_events("POST", url, headers=headers, json=body):
+        for choice in event.get("choices", []):
+            yield choice.get("delta", {}).get("content") or ""
+
+
 def main():
     st.title("🤖 Chat with Event Assistant")
 
@@ -48,7 +100,7 @@ def main():
         avatar = USER_AVATAR if message["role"] == "user" else BOT_AVATAR
         st.chat_message(message['role'], avatar=avatar).write(user_input)
 
-        url = "https://eu-de.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29"
+        url = f"{utils.WATSONX_URL}/ml/v1/text/chat?version=2023-05-29"
         model_messages = []
         latest_image_url = None
         for msg in st.session_state.messages:
@@ -69,27 +121,41 @@ def main():
         # st.write(model_messages[-1])
 
 
-        response = requests.post(
+        # Solo gli eventi pertinenti alla domanda, dal programma indicizzato
+        events = program_context(user_input)
+        system_prompt = SYSTEM_PROMPT + "\nFestival program events related to the question:\n" + \
+            "\n".join(json.dumps(event, ensure_ascii=False) for event in events)
+
+        body = {
+            "messages": [
+                {
+                "role":
+                "system",
+                "content": system_prompt
+                }, model_messages[-1]
+            ],
+            "project_id": utils.PROJECT_ID,
+            "model_id": "meta-llama/llama-3-1-70b-instruct",
+            "decoding_method": "greedy",
+            "repetition_penalty": 1,
+            "max_tokens": 900
+        }
+
+        if utils.WATSONX_STREAMING:
+            # La risposta compare parola per parola mentre il modello la genera
+            with st.chat_message("assistant", avatar=BOT_AVATAR):
+                res_content = st.write_stream(utils.report_first_token(stream_chat(body), "Event assistant"))
+            st.session_state.messages.append({"role": "assistant", "content": res_content})
+            return
+
+        response = http_client.post(
             url,
             headers={
             "Accept": "application/json",
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {utils.API_TOKEN}"
+            "Authorization": f"Bearer {utils.get_api_token()}"
         },
-            json={
-                "messages": [
-                    {
-                    "role":
-                    "system",
-                    "content": SYSTEM_PROMPT
-                    }, model_messages[-1]
-                ],
-                "project_id": utils.PROJECT_ID,
-                "model_id": "meta-llama/llama-3-1-70b-instruct",
-                "decoding_method": "greedy",
-                "repetition_penalty": 1,
-                "max_tokens": 900
-            }
+            json=body
         )
 
         if response.status_code != 200:
@@ -97,7 +163,6 @@ def main():
 
         data = response.json()
         res_content = data['choices'][0]['message']['content']
-        print(res_content)
 
         st.session_state.messages.append({"role": "assistant", "content": res_content})
         with st.chat_message("assistant", avatar=BOT_AVATAR):
@@ -0,0 +1,201 @@
+import os
+import re
+import glob
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+EVENTS_GLOB = os.path.join("data-scraping", "events-*-11.json")
+DATE_FORMAT = "%d/%m/%Y"
+# Inizio e fine sono testo "YYYY-MM-DD HH:MM": l'ordine alfabetico e' quello cronologico
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M"
+MIN_TOKEN_LENGTH = 3
+STOPWORDS = {"che", "chi", "cosa", "come", "con", "del", "della", "dei", "delle", "dove", "per", "quando",
+             "quale", "quali", "sono", "una", "uno", "alle", "all", "alla", "nel", "nella", "sul", "sulla",
+             "ore", "oggi", "domani", "novembre", "the", "and", "evento", "eventi"}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def place_key(location):
+    """Normalized location: "#MusicMainStage", "music main stage" and "Music-Main Stage" share a key."""
+    return re.sub(r"[^0-9a-z]", "", location.lower())
+
+
+def place_words(location):
+    """Words of a location hashtag, for full-text search: "#Si1-TeatrodelGiglio" -> "Si1 Teatrodel Giglio"."""
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", " ", location.lstrip("#")).replace("-", " ")
+
+
+def fts_query(text, match_any=False):
+    """
+    FTS5 query for free text: every word as a quoted prefix.
+
+    Words shorter than MIN_TOKEN_LENGTH (articles, numbers of dates and
+    times) and stopwords are dropped.
+
+    Returns:
+        str: The MATCH expression, or None if no word is left
+    """
+    words = re.findall(r"\w+", text.lower())
+    kept = [word for word in words if len(word) >= MIN_TOKEN_LENGTH and word not in STOPWORDS]
+    if not kept:
+        return None
+    return (" OR " if match_any else " ").join(f'"{word}"*' for word in dict.fromkeys(kept))
+
+
+def event_interval(event):
+    """Start and end timestamps of an event; an end at or before the start is on the next day."""
+    day = datetime.strptime(event["date"], DATE_FORMAT)
+    start = datetime.combine(day, datetime.strptime(event["start_time"], "%H:%M").time())
+    end = datetime.combine(day, datetime.strptime(event["end_time"], "%H:%M").time())
+    if end <= start:
+        end += timedelta(days=1)
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+
+
+class EventStore:
+    """
+    The festival program in an in-memory SQLite database.
+
+    Titles and location names are in an FTS5 index (prefix search,
+    accents ignored, BM25 ranking); start and end times and normalized
+    locations have B-tree indexes, so every query of search() touches only
+    the matching rows. Results are dicts in the format of the scraped
+    JSON files.
+    """
+
+    def __init__(self, events):
+        self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript('''
+            CREATE TABLE events (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                title TEXT NOT NULL,
+                location TEXT NOT NULL,
+                place TEXT NOT NULL,
+                start_time TEXT NOT NULL,
+                end_time TEXT NOT NULL,
+                start TEXT NOT NULL,
+                end TEXT NOT NULL,
+                warning TEXT
+            );
+            CREATE VIRTUAL TABLE events_fts USING fts5(title, place, tokenize='unicode61 remove_diacritics 2');
+        ''')
+        rows = []
+        for i, event in enumerate(events, 1):
+            start, end = event_interval(event)
+            rows.append((i, event["date"], event["title"], event["location"], place_key(event["location"]),
+                         event["start_time"], event["end_time"], start, end, event.get("warning")))
+        with self._conn:
+            self._conn.executemany('''INSERT INTO events (id, date, title, location, place, start_time, end_time, start, end, warning)
+                                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+            self._conn.executemany("INSERT INTO events_fts (rowid, title, place) VALUES (?, ?, ?)",
+                                   [(row[0], row[2], place_words(row[3])) for row in rows])
+            # Gli indici dopo il caricamento: costruzione in un solo passaggio
+            self._conn.executescript('''
+                CREATE INDEX events_start ON events (start, end);
+                CREATE INDEX events_date ON events (date, start, end);
+                CREATE INDEX events_place ON events (place, start, end);
+                ANALYZE;
+            ''')
+        self.size = len(rows)
+        self._places = {row[4] for row in rows}
+        # Durata dell'evento piu' lungo: un evento in corso all'istante T e' iniziato dopo T - max_duration
+        self.max_duration = max((datetime.strptime(row[8], TIMESTAMP_FORMAT) - datetime.strptime(row[7], TIMESTAMP_FORMAT)
+                                 for row in rows), default=timedelta(0))
+
+    @classmethod
+    def from_files(cls, paths):
+        events = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                events.extend(json.load(f))
+        return cls(events)
+
+    def search(self, text=None, at=None, location=None, date=None, match_any=False, limit=20):
+        """
+        Events matching every given filter.
+
+        Args:
+            text (str): Words of the title or of the location name (prefixes are enough)
+            at (datetime): Only events running at this time
+            location (str): Location name or part of it, e.g. "music main stage" or "citadel"
+            date (str): Day as "dd/mm/yyyy"
+            match_any (bool): Any word of text is enough, instead of all of them
+            limit (int): Maximum number of events
+
+        Returns:
+            list: Event dicts, best text matches first, otherwise by start time
+        """
+        joins = ""
+        where = []
+        params = []
+        # Lo stesso ordine degli indici: nessun ordinamento temporaneo
+        order = "events.start, events.end, events.id"
+        if text:
+            query = fts_query(text, match_any)
+            if query is None:
+                return []
+            joins = "JOIN events_fts ON events_fts.rowid = events.id"
+            where.append("events_fts MATCH ?")
+            params.append(query)
+            order = "bm25(events_fts), events.start"
+        if at is not None:
+            # Intervallo sull'indice di start limitato dalla durata massima; end filtra quelli gia' finiti
+            timestamp = at.strftime(TIMESTAMP_FORMAT)
+            earliest = (at - self.max_duration).strftime(TIMESTAMP_FORMAT)
+            where.append("events.start BETWEEN ? AND ? AND events.end > ?")
+            params.extend([earliest, timestamp, timestamp])
+        if location:
+            key = place_key(location)
+            if key in self._places:
+                where.append("events.place = ?")
+            else:
+                # Nome parziale: confronto sottostringa sulle chiavi normalizzate
+                where.append("instr(events.place, ?) > 0")
+            params.append(key)
+        if date:
+            where.append("events.date = ?")
+            params.append(date)
+        sql = f'''SELECT events.date, events.title, events.location, events.start_time, events.end_time, events.warning
+                  FROM events {joins}
+                  {"WHERE " + " AND ".join(where) if where else ""}
+                  ORDER BY {order} LIMIT ?'''
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [dict(zip(("date", "title", "location", "start_time", "end_time", "warning"), row)) for row in rows]
+
+    def running_at(self, at, location=None, limit=50):
+        """Events in progress at a given datetime, optionally at one location."""
+        return self.search(at=at, location=location, limit=limit)
+
+    def dates(self):
+        """Days of the program, as "dd/mm/yyyy", in order."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT date FROM events ORDER BY start")]
+
+    def locations(self):
+        """Distinct location hashtags of the program."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT location FROM events ORDER BY place")]
+
+
+def get_event_store(pattern=EVENTS_GLOB):
+    """
+    Return the EventStore of the program files, built once per process.
+
+    The store is rebuilt only when a file is added, removed or modified.
+    """
+    paths = sorted(glob.glob(pattern))
+    version = tuple((path, os.path.getmtime(path)) for path in paths)
+    with _stores_lock:
+        cached = _stores.get(pattern)
+        if cached is None or cached[0] != version:
+            cached = (version, EventStore.from_files(paths))
+            _stores[pattern] = cached
+        return cached[1]
@@ -0,0 +1,276 @@
+import os
+import time
+import queue
+import random
+import threading
+from concurrent.futures import Future
+from geopy.geocoders import Nominatim
+from geopy.adapters import BaseSyncAdapter, RequestsAdapter
+from geopy.exc import GeopyError
+import http_client
+from disk_cache import DiskCache
+from street_index import get_street_index, format_address
+
+# "auto": indice stradale locale se disponibile, altrimenti Nominatim
+# "offline": solo indice locale, "nominatim": solo servizio remoto
+GEOCODER_MODE = os.getenv("GEOCODER_MODE", "auto").lower()
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+
+# Policy di Nominatim: massimo 1 richiesta al secondo per applicazione
+MIN_REQUEST_INTERVAL = 1.0
+REQUEST_TIMEOUT = 10
+# Tentativi con backoff esponenziale, eseguiti dal worker e non dalla pagina
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+# 4 decimali ~ 11 m: click ripetuti sullo stesso punto usano la stessa chiave
+QUANTIZE_DECIMALS = 4
+REVERSE_CACHE_TTL = 30 * 24 * 3600
+REVERSE_CACHE_SIZE = 20000
+GEOCODE_CACHE_TTL = 30 * 24 * 3600
+# I luoghi e gli indirizzi non trovati vengono riprovati dopo un'ora
+GEOCODE_NEGATIVE_TTL = 3600
+GEOCODE_CACHE_SIZE = 5000
+# Tempo massimo che una pagina aspetta il proprio turno nella coda
+WAIT_TIMEOUT = 30
+
+
+class SharedSessionAdapter(RequestsAdapter):
+    """geopy adapter that sends requests through the shared http_client pool."""
+
+    def __init__(self, *, proxies=None, ssl_context=None):
+        BaseSyncAdapter.__init__(self, proxies=proxies, ssl_context=ssl_context)
+        self.session = http_client.session_for(NOMINATIM_URL)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def __del__(self):
+        # La sessione e' condivisa: non va chiusa con l'adapter
+        pass
+
+
+class NominatimClient:
+    """
+    Single Nominatim client shared by the whole process.
+
+    Requests are put on a queue and sent one at a time by a background
+    worker, at least MIN_REQUEST_INTERVAL seconds apart, however many
+    Streamlit sessions are calling it. Failed requests are re-queued with
+    exponential backoff, so neither the worker nor the caller sleeps
+    through a retry.
+    """
+
+    def __init__(self, user_agent="SmartEcoQ", min_interval=MIN_REQUEST_INTERVAL,
+                 max_retries=MAX_RETRIES, retry_base_delay=RETRY_BASE_DELAY):
+        self.geolocator = Nominatim(user_agent=user_agent, timeout=REQUEST_TIMEOUT, adapter_factory=SharedSessionAdapter)
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._requests = queue.Queue()
+        self._last_request = 0.0
+        self._worker = threading.Thread(target=self._run, name="nominatim-worker", daemon=True)
+        self._worker.start()
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Queue a geopy call (e.g. "reverse" or "geocode").
+
+        Returns:
+            Future: Resolved with the geopy result
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self._requests.put((future, 0, method, args, kwargs))
+        return future
+
+    def _run(self):
+        while True:
+            future, attempt, method, args, kwargs = self._requests.get()
+            wait = self._last_request + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                result = getattr(self.geolocator, method)(*args, **kwargs)
+            except GeopyError as e:
+                print(f"Attempt {attempt + 1} failed: {e}")
+                if attempt + 1 < self.max_retries:
+                    self._retry_later(future, attempt + 1, method, args, kwargs)
+                else:
+                    future.set_exception(e)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                self._last_request = time.monotonic()
+
+    def _retry_later(self, future, attempt, method, args, kwargs):
+        delay = self.retry_base_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        timer = threading.Timer(delay, self._requests.put, args=((future, attempt, method, args, kwargs),))
+        timer.daemon = True
+        timer.start()
+
+
+_client = None
+_reverse_cache = None
+_geocode_cache = None
+_init_lock = threading.Lock()
+# Richieste in corso, condivise tra le sessioni che chiedono la stessa chiave
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _init_lock:
+        if _client is None:
+            _client = NominatimClient()
+        return _client
+
+
+def get_reverse_cache():
+    global _reverse_cache
+    with _init_lock:
+        if _reverse_cache is None:
+            _reverse_cache = DiskCache("reverse_geocode", max_entries=REVERSE_CACHE_SIZE, ttl=REVERSE_CACHE_TTL)
+        return _reverse_cache
+
+
+def get_geocode_cache():
+    global _geocode_cache
+    with _init_lock:
+        if _geocode_cache is None:
+            _geocode_cache = DiskCache("geocode", max_entries=GEOCODE_CACHE_SIZE, ttl=GEOCODE_CACHE_TTL)
+        return _geocode_cache
+
+
+def quantize(coordinates, decimals=QUANTIZE_DECIMALS):
+    return f"{round(float(coordinates[0]), decimals)},{round(float(coordinates[1]), decimals)}"
+
+
+def normalize_place(place_name):
+    return " ".join(place_name.lower().split())
+
+
+def _request(key, method, args, kwargs, on_result):
+    # Una sola richiesta per chiave; on_result salva in cache appena arriva la risposta,
+    # anche se la pagina che l'ha chiesta ha smesso di aspettare
+    with _pending_lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        future = get_client().submit(method, *args, **kwargs)
+        _pending[key] = future
+
+    def done(f):
+        with _pending_lock:
+            _pending.pop(key, None)
+        if f.exception() is None:
+            on_result(f.result())
+
+    future.add_done_callback(done)
+    return future
+
+
+def reverse_geocode(coordinates):
+    """
+    Address of a coordinate pair.
+
+    The local street index answers first (see GEOCODER_MODE); Nominatim is
+    the fallback, with its results kept in the disk cache.
+
+    Args:
+        coordinates (tuple): (latitude, longitude)
+
+    Returns:
+        str: The Nominatim display address, "" if not found or if the
+            lookup failed; addresses not found are cached for GEOCODE_NEGATIVE_TTL
+    """
+    if GEOCODER_MODE != "nominatim":
+        street_index = get_street_index()
+        address = street_index.lookup(coordinates) if street_index is not None else None
+        if address is not None:
+            return format_address(address)
+        if GEOCODER_MODE == "offline":
+            return ""
+
+    cache = get_reverse_cache()
+    key = quantize(coordinates)
+    hit, address = cache.get(key)
+    if hit:
+        return address
+
+    def store(location):
+        if location:
+            cache.set(key, location.address)
+        else:
+            cache.set(key, "", ttl=GEOCODE_NEGATIVE_TTL)
+
+    future = _request("reverse:" + key, "reverse", ((coordinates[0], coordinates[1]),), {"language": "en"}, store)
+    try:
+        location = future.result(timeout=WAIT_TIMEOUT)
+    except TimeoutError:
+        print(f"Reverse geocoding of {key} still queued after {WAIT_TIMEOUT}s")
+        return ""
+    except Exception as e:
+        # Errore definitivo del worker (tentativi esauriti): la pagina mostra solo le coordinate
+        print(f"Reverse geocoding of {key} failed: {e}")
+        return ""
+    if location:
+        return location.address
+    else:
+        return ""
+
+
+def geocode_async(place_name):
+    """
+    Start (or join) the lookup of a place name without waiting for it.
+
+    Returns:
+        Future: Resolved with (latitude, longitude), or None if the place does not exist
+    """
+    cache = get_geocode_cache()
+    key = normalize_place(place_name)
+    result = Future()
+    hit, coordinates = cache.get(key)
+    if hit:
+        result.set_result(tuple(coordinates) if coordinates else None)
+        return result
+
+    def store(location):
+        if location:
+            cache.set(key, [location.latitude, location.longitude])
+        else:
+            cache.set(key, None, ttl=GEOCODE_NEGATIVE_TTL)
+
+    def convert(f):
+        if f.exception() is not None:
+            result.set_exception(f.exception())
+        else:
+            location = f.result()
+            result.set_result((location.latitude, location.longitude) if location else None)
+
+    _request("geocode:" + key, "geocode", (place_name,), {}, store).add_done_callback(convert)
+    return result
+
+
+def geocode(place_name, wait=WAIT_TIMEOUT):
+    """
+    Coordinates of a place name, from the cache when possible.
+
+    Args:
+        place_name (str): Free-form address
+        wait (float): Seconds to wait for a lookup that is not cached yet
+
+    Returns:
+        tuple: (latitude, longitude), or None if the place was not found
+
+    Raises:
+        TimeoutError: The lookup is still running; it keeps going in the
+            background and its result will be cached
+    """
+    try:
+        return geocode_async(place_name).result(timeout=wait)
+    except GeopyError as e:
+        print(f"Failed to retrieve location after maximum retries: {e}")
+        return None
@@ -0,0 +1,141 @@
+import os
+import json
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Timeout (secondi) di connessione e di lettura, configurabili da .env
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+# Connessioni keep-alive tenute aperte per ogni host
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+# Richieste contemporanee massime verso lo stesso host
+HOST_CONCURRENCY = int(os.getenv("HTTP_HOST_CONCURRENCY", 8))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+# Attesa tra i tentativi: BACKOFF_FACTOR * 2^n secondi, piu' un jitter casuale fino a BACKOFF_JITTER
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# Le POST ai modelli sono a pagamento e non idempotenti: si ripetono solo se il server non le ha accettate
+POST_RETRY_STATUS = (429, 503)
+
+_sessions = {}
+_semaphores = {}
+_lock = threading.Lock()
+
+
+class _Retry(Retry):
+    """
+    Retry policy of the shared sessions.
+
+    Idempotent methods are retried on connection and read errors and on
+    every RETRY_STATUS. A POST may already have started a paid generation
+    when the read times out, so it is retried only when it never reached
+    the server (connection errors) or was refused with POST_RETRY_STATUS.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == "POST":
+            return status_code in POST_RETRY_STATUS
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _host(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def session_for(url):
+    """
+    Shared requests.Session for the host of a URL.
+
+    Each host gets its own keep-alive connection pool, so TLS handshakes
+    are paid once per connection instead of once per request. Failed
+    connections and 429/5xx responses are retried with jittered
+    exponential backoff (see _Retry for POST requests).
+
+    Args:
+        url (str): Any URL on the host
+
+    Returns:
+        requests.Session: The session
+    """
+    host = _host(url)
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            # allowed_methods predefiniti (senza POST): nessun nuovo tentativo dopo un timeout di lettura
+            retry = _Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                backoff_jitter=BACKOFF_JITTER,
+                status_forcelist=RETRY_STATUS,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+            _semaphores[host] = threading.BoundedSemaphore(HOST_CONCURRENCY)
+        return session
+
+
+def request(method, url, **kwargs):
+    """
+    Send a request through the shared pool of its host.
+
+    Works like requests.request, with a default (connect, read) timeout
+    and at most HOST_CONCURRENCY requests in flight per host.
+    """
+    session = session_for(url)
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    with _semaphores[_host(url)]:
+        return session.request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def stream_events(method, url, **kwargs):
+    """
+    Send a request and yield the server-sent events of the response.
+
+    The connection and the host slot are held until the generator is
+    exhausted or closed.
+
+    Yields:
+        dict: The JSON payload of each "data:" event; a "[DONE]" event ends the stream
+
+    Raises:
+        requests.HTTPError: The server answered with an error status
+    """
+    session = session_for(url)
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    with _semaphores[_host(url)]:
+        with session.request(method, url, stream=True, **kwargs) as response:
+            response.raise_for_status()
+            # text/event-stream e' sempre UTF-8
+            response.encoding = "utf-8"
+            data = []
+            for line in response.iter_lines(decode_unicode=True):
+                if line is None:
+                    continue
+                if line.startswith("data:"):
+                    data.append(line[5:].lstrip())
+                elif not line and data:
+                    # Una riga vuota chiude l'evento
+                    payload = "\n".join(data)
+                    data = []
+                    if payload == "[DONE]":
+                        return
+                    yield json.loads(payload)
+            if data and data != ["[DONE]"]:
+                yield json.loads("\n".join(data))
@@ -0,0 +1,146 @@
+import io
+import os
+import hashlib
+import threading
+import numpy as np
+from PIL import Image
+
+# "dhash" (gradienti) oppure "phash" (DCT); su images/test-images dhash riconosce piu' varianti
+# ed e' piu' veloce, vedi benchmarks/eval_image_dedupe.py
+IMAGE_HASH_METHOD = os.getenv("IMAGE_HASH_METHOD", "dhash").lower()
+# Distanza di Hamming massima (su 64 bit) perche' due foto siano considerate la stessa
+IMAGE_HASH_THRESHOLD = int(os.getenv("IMAGE_HASH_THRESHOLD", 8))
+IMAGE_CACHE_SIZE = 1000
+
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+def _bits_to_int(bits):
+    return int(np.packbits(bits.ravel().astype(np.uint8)).view(">u8")[0])
+
+
+def _grayscale(image, size):
+    return np.asarray(image.convert("L").resize(size, Image.Resampling.BILINEAR), dtype=np.float64)
+
+
+def dhash(image):
+    """64-bit difference hash: sign of the horizontal gradient on a 9x8 thumbnail."""
+    pixels = _grayscale(image, (9, 8))
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(image):
+    """64-bit perceptual hash: low 8x8 DCT frequencies of a 32x32 thumbnail, compared to their median."""
+    pixels = _grayscale(image, (PHASH_SIZE, PHASH_SIZE))
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_LOW, :PHASH_LOW]
+    # Il termine DC non dice nulla sulla struttura dell'immagine
+    return _bits_to_int(low > np.median(low.ravel()[1:]))
+
+
+HASH_FUNCTIONS = {"phash": phash, "dhash": dhash}
+
+
+def image_hash(image_bytes, method=IMAGE_HASH_METHOD):
+    """Perceptual hash of an encoded image, as an int."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft("L", (PHASH_SIZE * 4, PHASH_SIZE * 4))  # decodifica JPEG ridotta, molto piu' veloce
+        return HASH_FUNCTIONS[method](image)
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class ImageDedupCache:
+    """
+    Identification results of recent photos, found again by perceptual hash.
+
+    An exact byte match (a Streamlit rerun of the same camera frame) is a
+    dict lookup; otherwise the hash is compared with every stored one in a
+    single NumPy pass, and the closest hash within `threshold` bits wins.
+    The oldest entries are dropped past max_entries.
+    """
+
+    def __init__(self, threshold=IMAGE_HASH_THRESHOLD, method=IMAGE_HASH_METHOD, max_entries=IMAGE_CACHE_SIZE):
+        self.threshold = threshold
+        self.method = method
+        self.max_entries = max_entries
+        self._digests = {}
+        self._hashes = np.zeros(max_entries, dtype=np.uint64)
+        self._results = [None] * max_entries
+        self._digest_of = [None] * max_entries
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def key(self, image_bytes):
+        """
+        Lookup key of an image: (content digest, perceptual hash).
+
+        The hash is only computed when the exact bytes are not cached.
+        """
+        digest = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        with self._lock:
+            if digest in self._digests:
+                return digest, None
+        return digest, image_hash(image_bytes, self.method)
+
+    def get(self, key):
+        """
+        Result stored for the same or a near-duplicate image.
+
+        Returns:
+            tuple: (result, Hamming distance), or (None, None) on a miss
+        """
+        digest, value = key
+        with self._lock:
+            slot = self._digests.get(digest)
+            if slot is not None:
+                return self._results[slot], 0
+            if value is None or self._size == 0:
+                return None, None
+            distances = np.bitwise_count(self._hashes[:self._size] ^ np.uint64(value))
+            slot = int(np.argmin(distances))
+            distance = int(distances[slot])
+            if distance > self.threshold:
+                return None, None
+            return self._results[slot], distance
+
+    def set(self, key, result):
+        digest, value = key
+        if value is None:
+            return
+        with self._lock:
+            slot = self._next
+            old_digest = self._digest_of[slot]
+            if old_digest is not None:
+                self._digests.pop(old_digest, None)
+            self._hashes[slot] = np.uint64(value)
+            self._results[slot] = result
+            self._digest_of[slot] = digest
+            self._digests[digest] = slot
+            self._next = (slot + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+
+def get_image_cache():
+    """The ImageDedupCache shared by the whole process."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageDedupCache()
+        return _cache
@@ -0,0 +1,75 @@
+import io
+import os
+import time
+import base64
+from PIL import Image, ImageOps
+
+# Lato lungo massimo inviato al modello di visione, e qualita' JPEG della ricompressione
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", 1024))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+# Formati che il modello di visione accetta cosi' come sono
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+def _encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer
+
+
+def prepare_image(image_bytes, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_JPEG_QUALITY):
+    """
+    Shrink a photo for the vision model and encode it as base64.
+
+    The image is decoded once (JPEGs at reduced scale when they are much
+    larger than max_edge), rotated according to its EXIF orientation,
+    downsized so that its longest edge is at most max_edge and re-encoded
+    as JPEG at the given quality, never lower. An upload that already
+    fits max_edge is sent unchanged (when its format is in MIME_TYPES)
+    unless the re-encode is smaller, so it never gets bigger; a larger
+    upload is always sent downsized, so the longest edge sent is at most
+    max_edge.
+
+    Args:
+        image_bytes (bytes): Encoded image from the camera
+        max_edge (int): Longest edge in pixels
+        quality (int): JPEG quality
+
+    Returns:
+        tuple: (base64 str, stats dict with original_bytes, sent_bytes,
+            saved_bytes, size, quality (None for the original), mime and elapsed_ms)
+    """
+    start = time.perf_counter()
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        original_format = image.format
+        original_size = image.size
+        image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        size = image.size
+        buffer = _encode_jpeg(image, quality)
+
+    fits = max(original_size) <= max_edge
+    if fits and original_format in MIME_TYPES and len(image_bytes) <= buffer.tell():
+        # Gia' abbastanza piccola e la ricompressione non farebbe risparmiare nulla
+        payload = memoryview(image_bytes)
+        size = original_size
+        quality = None
+        mime = MIME_TYPES[original_format]
+    else:
+        payload = buffer.getbuffer()
+        mime = MIME_TYPES["JPEG"]
+    # b64encode legge direttamente dal buffer, senza copiarlo in un nuovo bytes
+    encoded = base64.b64encode(payload).decode("ascii")
+    stats = {
+        "original_bytes": len(image_bytes),
+        "sent_bytes": len(payload),
+        "saved_bytes": len(image_bytes) - len(payload),
+        "size": size,
+        "quality": quality,
+        "mime": mime,
+        "elapsed_ms": (time.perf_counter() - start) * 1000
+    }
+    return encoded, stats
@@ -0,0 +1,158 @@
+import io
+import os
+import time
+import threading
+import numpy as np
+import cv2
+from PIL import Image, ImageOps
+
+# Classificatore ImageNet in formato ONNX (es. MobileNetV2 del model zoo ONNX), eseguito su CPU con OpenCV DNN.
+# Il modello non e' nel repository: senza il file il livello locale e' disattivato.
+LOCAL_VISION_MODEL = os.getenv("LOCAL_VISION_MODEL", os.path.join("models", "mobilenetv2-12.onnx"))
+LOCAL_VISION_LABELS = os.getenv("LOCAL_VISION_LABELS", os.path.join("models", "synset.txt"))
+# Sotto questa confidenza la foto va comunque al modello remoto; oltre 1 il livello locale non risponde mai
+LOCAL_VISION_THRESHOLD = float(os.getenv("LOCAL_VISION_THRESHOLD", 0.6))
+
+INPUT_SIZE = 224
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# Classi ImageNet dei rifiuti piu' comuni, con il nome che BinIndex risolve in un bidone di data.json
+WASTE_CLASSES = {
+    "banana": "banana peel",
+    "orange": "orange peel",
+    "lemon": "lemon peel",
+    "granny smith": "apple core",
+    "strawberry": "fruit scraps",
+    "pineapple": "fruit scraps",
+    "pomegranate": "fruit scraps",
+    "fig": "fruit scraps",
+    "broccoli": "food leftovers",
+    "cauliflower": "food leftovers",
+    "head cabbage": "food leftovers",
+    "cucumber": "food leftovers",
+    "zucchini": "food leftovers",
+    "bell pepper": "food leftovers",
+    "pizza": "pizza",
+    "french loaf": "bread",
+    "bagel": "bread",
+    "pretzel": "bread",
+    "water bottle": "plastic bottle",
+    "pop bottle": "plastic bottle",
+    "beer bottle": "glass bottle",
+    "wine bottle": "glass bottle",
+    "plastic bag": "plastic bag",
+    "carton": "cardboard box",
+    "paper towel": "paper towel",
+    "comic book": "book",
+    "book jacket": "book",
+    "running shoe": "shoe",
+    "sandal": "shoe",
+    "loafer": "shoe",
+    "clog": "shoe",
+    "cowboy boot": "shoe",
+    "jersey": "t-shirt",
+    "sweatshirt": "t-shirt",
+    "umbrella": "umbrella",
+}
+
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
+
+def load_labels(path):
+    """
+    ImageNet class names, one per line.
+
+    Both "n07753592 banana" (synset.txt) and "banana" lines are accepted;
+    only the first of the comma-separated synonyms is kept, lowercased.
+    """
+    labels = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line[:1] == "n" and line[1:9].isdigit():
+                line = line[10:]
+            labels.append(line.split(",")[0].strip().lower())
+    return labels
+
+
+def softmax(scores):
+    scores = scores - scores.max()
+    exp = np.exp(scores)
+    return exp / exp.sum()
+
+
+class LocalVisionClassifier:
+    """
+    CPU image classifier for the most common festival waste.
+
+    The probabilities of the ImageNet classes that map to the same waste
+    item are added together; the best item and its total probability are
+    returned, and the caller decides whether that is confident enough to
+    skip the remote vision model.
+    """
+
+    def __init__(self, model_path, labels_path):
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.labels = load_labels(labels_path)
+        # Indici delle classi di rifiuti e colonna dell'oggetto corrispondente
+        self.items = sorted(set(WASTE_CLASSES.values()))
+        self._class_ids = np.array([i for i, label in enumerate(self.labels) if label in WASTE_CLASSES], dtype=np.intp)
+        self._item_ids = np.array([self.items.index(WASTE_CLASSES[self.labels[i]]) for i in self._class_ids], dtype=np.intp)
+        # cv2.dnn.Net non e' thread-safe
+        self._lock = threading.Lock()
+
+    def _blob(self, image_bytes):
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            image.draft("RGB", (INPUT_SIZE * 2, INPUT_SIZE * 2))  # decodifica JPEG ridotta
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            # Lato corto a INPUT_SIZE e ritaglio centrale, prima di normalizzare: pochi pixel da elaborare
+            image = ImageOps.fit(image, (INPUT_SIZE, INPUT_SIZE), Image.Resampling.BILINEAR)
+        pixels = (np.asarray(image, dtype=np.float32) / 255 - MEAN) / STD
+        return cv2.dnn.blobFromImage(pixels, 1.0, (INPUT_SIZE, INPUT_SIZE), swapRB=False, crop=False)
+
+    def classify(self, image_bytes):
+        """
+        Classify one photo.
+
+        Returns:
+            dict: item (waste item name, or None if the photo is not one of
+                WASTE_CLASSES), confidence, label (top ImageNet class) and elapsed_ms
+        """
+        start = time.perf_counter()
+        blob = self._blob(image_bytes)
+        with self._lock:
+            self.net.setInput(blob)
+            scores = self.net.forward().reshape(-1).astype(np.float64)
+        # Alcuni modelli esportati hanno gia' la softmax nell'ultimo strato
+        if scores.min() < 0 or abs(scores.sum() - 1) > 1e-3:
+            scores = softmax(scores)
+        per_item = np.bincount(self._item_ids, weights=scores[self._class_ids], minlength=len(self.items))
+        best = int(np.argmax(per_item))
+        confidence = float(per_item[best])
+        return {
+            "item": self.items[best] if confidence > 0 else None,
+            "confidence": confidence,
+            "label": self.labels[int(np.argmax(scores))],
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+        }
+
+
+def get_local_classifier(model_path=LOCAL_VISION_MODEL, labels_path=LOCAL_VISION_LABELS):
+    """
+    Return the LocalVisionClassifier, loaded at most once per process.
+
+    Returns:
+        LocalVisionClassifier: The cached classifier, or None if the model
+            or the labels file is not available
+    """
+    if not (os.path.exists(model_path) and os.path.exists(labels_path)):
+        return None
+    mtime = os.path.getmtime(model_path)
+    with _classifiers_lock:
+        cached = _classifiers.get(model_path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, LocalVisionClassifier(model_path, labels_path))
+            _classifiers[model_path] = cached
+        return cached[1]
@@ -0,0 +1,126 @@
+import os
+import time
+import geocoder
+import streamlit.components.v1 as components
+import http_client
+
+# Punti di partenza simulati, selezionabili dalla sidebar del navigator
+SIMULATION_PRESETS = {
+    "Simulation: Lucca 1": (43.8430153, 10.502204),
+    "Simulation: Lucca 2": (43.843, 10.508),
+    "Simulation: Lucca 3": (43.8408387, 10.4996806),
+}
+# Servizio usato da geocoder.ip
+IP_LOCATION_URL = "http://ipinfo.io"
+IP_LOCATION = "Use IP location"
+BROWSER_LOCATION = "Use browser location"
+STARTING_POINT_MODES = list(SIMULATION_PRESETS) + [IP_LOCATION, BROWSER_LOCATION]
+
+# La posizione da IP viene risolta una volta per sessione e rinnovata dopo IP_LOCATION_TTL secondi
+IP_LOCATION_TTL = 10 * 60
+# Dopo un errore si riprova solo dopo IP_FAILURE_TTL secondi
+IP_FAILURE_TTL = 60
+
+# Componente invisibile che chiede la posizione al browser (navigator.geolocation)
+_browser_location_component = components.declare_component(
+    "browser_location", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "browser_location")
+)
+
+
+def get_current_coordinates_using_IP():
+    g = geocoder.ip('me', session=http_client.session_for(IP_LOCATION_URL))  # Detects your current IP
+    if g.latlng:
+        return tuple(g.latlng)  # Returns (latitude, longitude)
+    else:
+        return None
+
+
+def get_ip_location(session_state):
+    """
+    IP location of the visitor, cached in the Streamlit session.
+
+    Args:
+        session_state: st.session_state
+
+    Returns:
+        tuple: (latitude, longitude), or None if it could not be determined
+    """
+    cached = session_state.get("ip_location")
+    now = time.time()
+    if cached is not None and now < cached["expires_at"]:
+        return cached["coordinates"]
+
+    try:
+        coordinates = get_current_coordinates_using_IP()
+    except Exception as e:
+        print(f"IP geolocation failed: {e}")
+        coordinates = None
+    session_state["ip_location"] = {
+        "coordinates": coordinates,
+        "expires_at": now + (IP_LOCATION_TTL if coordinates else IP_FAILURE_TTL)
+    }
+    return coordinates
+
+
+def request_browser_location(query_params):
+    """
+    Ask the browser for its position and write it as ?lat=...&lon=... query parameters.
+
+    The position arrives asynchronously: the first run returns None and
+    the component triggers a rerun once the visitor has answered the
+    permission prompt. Coordinates already in the URL (a reload or a
+    shared link) are used as they are.
+
+    Args:
+        query_params: st.query_params
+
+    Returns:
+        str: The browser's error message, or None
+    """
+    position = _browser_location_component(key="browser_location", default=None)
+    if not position:
+        return None
+    if "error" in position:
+        return position["error"]
+    query_params["lat"] = f"{position['lat']:.6f}"
+    query_params["lon"] = f"{position['lon']:.6f}"
+    return None
+
+
+def get_browser_location(query_params):
+    """
+    Coordinates supplied by the browser as ?lat=...&lon=... query parameters.
+
+    Returns:
+        tuple: (latitude, longitude), or None if missing or invalid
+    """
+    try:
+        lat = float(query_params["lat"])
+        lon = float(query_params["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return (lat, lon)
+    return None
+
+
+def get_start_location(mode, session_state, query_params):
+    """
+    Starting point for the selected mode.
+
+    Presets never touch the network; IP location is resolved at most once
+    per session per TTL, so a rerun does not wait on an external lookup.
+
+    Args:
+        mode (str): One of STARTING_POINT_MODES
+        session_state: st.session_state
+        query_params: st.query_params
+
+    Returns:
+        tuple: (latitude, longitude), or None if the location is not available
+    """
+    if mode in SIMULATION_PRESETS:
+        return SIMULATION_PRESETS[mode]
+    if mode == BROWSER_LOCATION:
+        return get_browser_location(query_params)
+    return get_ip_location(session_state)
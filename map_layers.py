@@ -0,0 +1,111 @@
+import base64
+import json
+import numpy as np
+from folium.plugins import FastMarkerCluster
+
+# Sopra questa soglia la modalita' "Auto" usa il layer raggruppato
+CLUSTER_THRESHOLD = 200
+# Margine aggiunto su ogni lato del viewport, come frazione della sua dimensione
+VIEWPORT_PADDING = 0.5
+# Da questo zoom in su i marker vengono mostrati singolarmente
+DISABLE_CLUSTERING_AT_ZOOM = 17
+
+_data_urls = {}
+
+_CALLBACK_TEMPLATE = """(function () {
+    var styles = %s.map(function (s) {
+        if (s.image) {
+            return L.icon({iconUrl: s.image, iconSize: s.size});
+        }
+        return L.AwesomeMarkers.icon({icon: s.icon, markerColor: s.color, prefix: "glyphicon"});
+    });
+    var labels = %s;
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: styles[row[2]]});
+        var popup = document.createElement("div");
+        popup.innerText = labels[row[3]];
+        marker.bindPopup(popup);
+        if (row.length > 4) {
+            marker.bindTooltip(row[4]);
+        }
+        return marker;
+    };
+})()"""
+
+
+def image_data_url(path):
+    """Base64 data URL of an image file, read once per process."""
+    if path not in _data_urls:
+        with open(path, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('utf-8')
+        _data_urls[path] = "data:image/png;base64," + encoded
+    return _data_urls[path]
+
+
+def image_style(path, size):
+    return {"image": image_data_url(path), "size": list(size)}
+
+
+def marker_style(icon, color):
+    return {"icon": icon, "color": color}
+
+
+def viewport_mask(lat, lon, bounds, padding=VIEWPORT_PADDING):
+    """
+    Boolean mask of the points inside the (padded) map viewport.
+
+    Args:
+        lat (np.ndarray): Latitudes
+        lon (np.ndarray): Longitudes
+        bounds (dict): The "bounds" value returned by st_folium
+        padding (float): Extra margin on each side, as a fraction of the viewport size
+
+    Returns:
+        np.ndarray: The mask, all True if the bounds are unknown
+    """
+    try:
+        south = bounds["_southWest"]["lat"]
+        west = bounds["_southWest"]["lng"]
+        north = bounds["_northEast"]["lat"]
+        east = bounds["_northEast"]["lng"]
+    except (KeyError, TypeError):
+        return np.ones(len(lat), dtype=bool)
+    if None in (south, west, north, east):
+        return np.ones(len(lat), dtype=bool)
+
+    pad_lat = (north - south) * padding
+    pad_lon = (east - west) * padding
+    return ((lat >= south - pad_lat) & (lat <= north + pad_lat) &
+            (lon >= west - pad_lon) & (lon <= east + pad_lon))
+
+
+def poi_cluster_layer(lat, lon, labels, styles, style_idx, tooltips=None, name="POI"):
+    """
+    Build a single clustered layer for many points.
+
+    The points are sent as one compact array, and the browser creates the
+    markers. Icons and popup labels are stored once and referenced by
+    index, so each point only adds a few numbers to the payload.
+
+    Args:
+        lat (np.ndarray): Latitudes
+        lon (np.ndarray): Longitudes
+        labels (np.ndarray): Popup text of each point
+        styles (list): Icon styles, built with image_style or marker_style
+        style_idx (np.ndarray): Index into styles for each point
+        tooltips (np.ndarray): Optional tooltip text of each point
+        name (str): Layer name
+
+    Returns:
+        FastMarkerCluster: The layer
+    """
+    unique_labels, label_idx = np.unique(np.asarray(labels, dtype=str), return_inverse=True)
+    columns = [np.round(lat, 6).tolist(), np.round(lon, 6).tolist(),
+               np.asarray(style_idx).tolist(), label_idx.tolist()]
+    if tooltips is not None:
+        columns.append([str(t) for t in tooltips])
+    data = [list(row) for row in zip(*columns)]
+
+    callback = _CALLBACK_TEMPLATE % (json.dumps(styles), json.dumps(unique_labels.tolist()))
+    return FastMarkerCluster(data, callback=callback, name=name,
+                             disableClusteringAtZoom=DISABLE_CLUSTERING_AT_ZOOM)
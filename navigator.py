@@ -1,63 +1,32 @@
 import streamlit as st
 import os
-import json
-import pandas as pd
+import numpy as np
 import folium
 from streamlit_folium import st_folium
 import requests
-import polyline
 from dotenv import load_dotenv
-import geocoder
-from geopy.geocoders import Nominatim
-from geopy.exc import GeopyError
-import time
+from location import get_start_location, get_browser_location, request_browser_location, STARTING_POINT_MODES, BROWSER_LOCATION
+from poi_store import get_poi_store, QUEUE_MISSING
+from queue_state import get_queue_state, get_queue_rows, get_live_queue, poi_key
+from queue_simulator import QUEUE_SIMULATION, start_simulation
+from geocoding import reverse_geocode, geocode
+from routing import get_route, travel_times, RoutingError
+from map_layers import CLUSTER_THRESHOLD, poi_cluster_layer, image_style, marker_style, viewport_mask
 
 
 load_dotenv()
-location_cache = {}
+# Tempo di servizio stimato per ogni persona in coda
+MINUTES_PER_PERSON = 1
 
 
-def get_current_coordinates_using_IP():
-    g = geocoder.ip('me')  # Detects your current IP
-    if g.latlng:
-        return g.latlng  # Returns [latitude, longitude]
-    else:
-        return "Could not determine location"
-
 def get_street_from_coordinates(coordinates):
-    geolocator = Nominatim(user_agent="SmartEcoQ")  # Replace with a descriptive app name
-    location = geolocator.reverse((coordinates[0], coordinates[1]), language='en', timeout=10)
-    print(location)
-    if location:
-        return location.address
-    else:
-        return ""
+    # Cache su disco + client Nominatim condiviso (1 richiesta/s)
+    return reverse_geocode(coordinates)
     
-def get_lat_lon(place_name, max_retries=5, retry_delay=2):
-    geolocator = Nominatim(user_agent="streamlit_map_app")
-
-    # Check if the place_name is already in the cache
-    if place_name in location_cache:
-        print(f"Using cached coordinates for {place_name}")
-        return location_cache[place_name]
-
-    location = None
-    for attempt in range(max_retries):
-        try:
-            location = geolocator.geocode(place_name + ", lucca")
-            if location:
-                # Cache the result
-                coordinates = (location.latitude, location.longitude)
-                location_cache[place_name] = coordinates
-                return coordinates
-        except GeopyError as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-        time.sleep(retry_delay)
-
-    # Cache None for places not found to avoid retrying in the future
-    location_cache[place_name] = None
-    print("Failed to retrieve location after maximum retries.")
-    return None
+def get_lat_lon(place_name, wait=10):
+    # Cache condivisa su disco; i tentativi falliti vengono ripetuti in background.
+    # Solleva TimeoutError se la ricerca non e' ancora terminata dopo `wait` secondi
+    return geocode(place_name + ", lucca", wait=wait)
 
 def write_formatted_address(address: str) -> str:
     # Split the address into components
@@ -115,10 +84,10 @@ def choose_icon_type(queue):
     else:
         return "high"
 
-def choose_icon(dataset_options, selected_dataset, point):
+def choose_icon(dataset_options, selected_dataset, queue):
     if selected_dataset == "Public Toilets":
         return folium.CustomIcon(
-            icon_image="images/toilet-" + choose_icon_type(point["properties"].get("queue")) + ".png",
+            icon_image="images/toilet-" + choose_icon_type(queue) + ".png",
             icon_size=(45, 45)
         )
     else:
@@ -128,6 +97,88 @@ def choose_icon(dataset_options, selected_dataset, point):
             )
 
 
+def choose_icon_styles(dataset_options, selected_dataset):
+    # Stili per poi_cluster_layer, nello stesso ordine di choose_icon_style_idx
+    if selected_dataset == "Public Toilets":
+        return [image_style("images/toilet-" + level + ".png", (45, 45)) for level in ("low", "medium", "high")]
+    else:
+        return [marker_style(dataset_options[selected_dataset]["icon"], dataset_options[selected_dataset]["color"])]
+
+def choose_icon_style_idx(selected_dataset, queue):
+    if selected_dataset == "Public Toilets":
+        # Stesse soglie di choose_icon_type
+        return np.digitize(queue, [5, 10])
+    else:
+        return np.zeros(len(queue), dtype=np.int64)
+
+
+def get_vehicle():
+    if st.session_state.selected_travel_mode.lower() == "walk":
+        return "foot"
+    else:
+        return st.session_state.selected_travel_mode.lower()
+
+def go_to_destination(store, queue, i):
+    # Stesso stato che lascia un click sulla mappa
+    st.session_state.last_object_clicked = {"lat": float(store.lat[i]), "lng": float(store.lon[i])}
+    st.session_state.last_object_clicked_tooltip = str(queue[i]) if queue[i] != QUEUE_MISSING else None
+    st.session_state.destination_poi = poi_key(store, i)
+    st.session_state["page"] = 2
+    st.rerun()
+
+
+def nearest_panel(store, queue, filtered_idx, selected_dataset):
+    start = st.session_state.start
+    if start is None or len(filtered_idx) == 0:
+        return
+
+    n = 1
+    if len(filtered_idx) > 1:
+        n = st.sidebar.slider("Nearest points to show", min_value=1, max_value=min(10, len(filtered_idx)), value=min(3, len(filtered_idx)))
+    mask = np.zeros(len(store), dtype=bool)
+    mask[filtered_idx] = True
+    nearest_idx, distances = store.spatial_index.nearest(start[0], start[1], k=n, mask=mask)
+
+    st.write(f"### Nearest {len(nearest_idx)} to you")
+    for rank, (i, distance) in enumerate(zip(nearest_idx, distances)):
+        label = store.name[i] or store.amenity[i]
+        details = f"{int(round(distance))} m"
+        if queue[i] != QUEUE_MISSING:
+            details += f", queue: {queue[i]} people"
+        col1, col2 = st.columns([4, 1])
+        col1.write(f"{rank + 1}. {label} ({details})")
+        if col2.button("Go", key=f"nearest_{selected_dataset}_{i}"):
+            go_to_destination(store, queue, i)
+
+
+def fastest_panel(store, queue, filtered_idx, selected_dataset, n=3):
+    # Classifica per tempo di viaggio + coda prevista all'arrivo
+    start = st.session_state.start
+    candidates = filtered_idx[queue[filtered_idx] != QUEUE_MISSING]
+    if start is None or len(candidates) == 0:
+        return
+
+    travel_seconds = travel_times(start, store.lat[candidates], store.lon[candidates], get_vehicle())
+    travel_minutes = travel_seconds / 60
+    expected_queue, queue_minutes = get_queue_state().predict_wait(
+        get_queue_rows(store)[candidates], travel_seconds, MINUTES_PER_PERSON)
+    total_minutes = travel_minutes + queue_minutes
+    order = np.argsort(total_minutes, kind="stable")[:n]
+
+    st.write("### Fastest to reach (travel + queue on arrival)")
+    for rank, j in enumerate(order):
+        if not np.isfinite(total_minutes[j]):
+            break
+        i = candidates[j]
+        label = store.name[i] or store.amenity[i]
+        col1, col2 = st.columns([4, 1])
+        col1.write(f"{rank + 1}. {label}: {round(travel_minutes[j], 1)} min travel + "
+                   f"{round(queue_minutes[j], 1)} min queue (~{round(expected_queue[j])} people on arrival) = "
+                   f"**{round(total_minutes[j], 1)} min**")
+        if col2.button("Go", key=f"fastest_{selected_dataset}_{i}"):
+            go_to_destination(store, queue, i)
+
+
 def page1():
     dataset_options = {
         "Ecopoints": {
@@ -174,36 +225,24 @@ def page1():
         st.stop()
         #return
 
-    # Carica il file GeoJSON selezionato
+    # Carica il file GeoJSON selezionato (una volta per processo, condiviso tra le sessioni)
     geojson_file_path = os.path.join('data', dataset_options[selected_dataset]["dataset"])
-    with open(geojson_file_path, 'r') as f:
-        geojson_data = json.load(f)
-
-    # Estrai i dati dal GeoJSON
-    data = []
-    for feature in geojson_data["features"]:
-        properties = feature["properties"]
-        coordinates = feature["geometry"]["coordinates"]
-        data.append({
-            "latitude": coordinates[1],  # Latitudine
-            "longitude": coordinates[0],  # Longitudine
-            "properties": properties
-        })
-
-    # Converti i dati in un DataFrame
-    df = pd.DataFrame(data)
-    amenities = df["properties"].apply(lambda x: x.get("amenity", "Sconosciuto")).unique()
+    store = get_poi_store(geojson_file_path)
+    # Code attuali dal servizio in memoria (inizializzato con i valori del file)
+    queue = get_live_queue(store)
+
+    amenities = store.amenities
     selected_amenities = st.sidebar.multiselect(
         "Select the typology",
         options=amenities,
         default=amenities
     )
     # Filtra i dati in base alla selezione
-    filtered_df = df[df["properties"].apply(lambda x: x.get("amenity", "Sconosciuto") in selected_amenities)]
+    mask = store.amenity_mask(selected_amenities)
 
     if selected_dataset == "Ecopoints":
         # Extract unique materials
-        materials = sorted({mat for mats in filtered_df["properties"].apply(lambda x: x.get("materials")) for mat in mats})
+        materials = store.materials_in(mask)
         # Streamlit multi-select for materials
         selected_materials = st.sidebar.multiselect(
             "Select materials",
@@ -211,57 +250,78 @@ def page1():
             default=materials  # Preselect all materials
         )
         # Filter data based on selected materials
-        filtered_df = filtered_df[filtered_df["properties"].apply(lambda x: any(mat in x.get("materials", []) for mat in selected_materials))]
+        mask &= store.material_mask(selected_materials)
+
+    filtered_idx = np.flatnonzero(mask)
 
 
     # Impostiamo start a una posizione specifica
-    if st.session_state.selected_starting_point_mode == "Simulation: Lucca 1":
-        st.session_state.start = (43.8430153,10.502204)
-    elif st.session_state.selected_starting_point_mode == "Simulation: Lucca 2":
-        st.session_state.start = (43.843, 10.508)
-    elif st.session_state.selected_starting_point_mode == "Simulation: Lucca 3":
-        st.session_state.start = (43.8408387,10.4996806)
-    else:
-        st.session_state.start = get_current_coordinates_using_IP()
+    st.session_state.start = get_start_location(st.session_state.selected_starting_point_mode, st.session_state, st.query_params)
+    if st.session_state.start is None:
+        st.warning("Could not determine your location: pick a simulation starting point or allow location access.")
 
     # Crea la mappa con Folium
-    map_center = [df["latitude"].mean(), df["longitude"].mean()]
+    map_center = store.center
     m = folium.Map(location=map_center, zoom_start=15, control_scale=True)
     fg = folium.FeatureGroup(name="Markers")
 
     # Aggiungi un marker per lo starting point
-    fg.add_child(folium.Marker(
-        location=st.session_state.start,
-        popup="You are here",
-        icon=folium.CustomIcon(
-            icon_image="images/me-marker.png",
-            icon_size=(50, 50)
-    )))
-
-
-    # Aggiungi marker per i punti filtrati
-    for _, point in filtered_df.iterrows():
-        if selected_dataset == "Public Toilets":
-            fg.add_child(folium.Marker(
-                location=[point["latitude"], point["longitude"]],
-                popup=point["properties"].get("amenity", "Info point"),
-                tooltip="queue: " + str(point["properties"].get("queue")),
-                icon=choose_icon(dataset_options, selected_dataset, point)
-            ))
-        else:
-            fg.add_child(folium.Marker(
-                    location=[point["latitude"], point["longitude"]],
-                    popup=point["properties"].get("amenity", "Info point"),
-                    icon=choose_icon(dataset_options, selected_dataset, point)
-            ))
+    if st.session_state.start is not None:
+        fg.add_child(folium.Marker(
+            location=st.session_state.start,
+            popup="You are here",
+            icon=folium.CustomIcon(
+                icon_image="images/me-marker.png",
+                icon_size=(50, 50)
+        )))
+
+
+    # Disegna solo i punti nel viewport corrente (con margine)
+    if "map_bounds" not in st.session_state:
+        st.session_state.map_bounds = None
+    visible_idx = filtered_idx[viewport_mask(store.lat[filtered_idx], store.lon[filtered_idx], st.session_state.map_bounds)]
+
+    if st.session_state.marker_rendering == "Clustered" or (
+            st.session_state.marker_rendering == "Auto" and len(visible_idx) > CLUSTER_THRESHOLD):
+        # Un unico layer: i marker vengono creati dal browser
+        fg.add_child(poi_cluster_layer(
+            store.lat[visible_idx],
+            store.lon[visible_idx],
+            labels=store.amenity[visible_idx],
+            styles=choose_icon_styles(dataset_options, selected_dataset),
+            style_idx=choose_icon_style_idx(selected_dataset, queue[visible_idx]),
+            tooltips=["queue: " + str(q) for q in queue[visible_idx]] if selected_dataset == "Public Toilets" else None,
+            name=selected_dataset
+        ))
+    else:
+        # Aggiungi marker per i punti filtrati
+        for lat, lon, amenity, poi_queue in zip(store.lat[visible_idx], store.lon[visible_idx],
+                                                store.amenity[visible_idx], queue[visible_idx]):
+            if selected_dataset == "Public Toilets":
+                fg.add_child(folium.Marker(
+                    location=[lat, lon],
+                    popup=amenity,
+                    tooltip="queue: " + str(poi_queue),
+                    icon=choose_icon(dataset_options, selected_dataset, poi_queue)
+                ))
+            else:
+                fg.add_child(folium.Marker(
+                        location=[lat, lon],
+                        popup=amenity,
+                        icon=choose_icon(dataset_options, selected_dataset, poi_queue)
+                ))
 
     # Mostra la mappa in Streamlit
     map_html = st_folium(m, feature_group_to_add=fg, width=700)
+    st.session_state.map_bounds = map_html.get("bounds")
 
     if "last_object_clicked" not in st.session_state:
         st.session_state.last_object_clicked = None
     
     last_object = map_html.get("last_object_clicked", {})
+    if last_object and not map_html.get("last_object_clicked_popup"):
+        # Click su un gruppo del layer raggruppato, non su un punto
+        last_object = None
     st.session_state.last_object_clicked = last_object
     last_object_clicked_popup = map_html.get("last_object_clicked_popup", "")
     last_object_clicked_tooltip = map_html.get("last_object_clicked_tooltip", "")
@@ -269,7 +329,12 @@ def page1():
         st.session_state.last_object_clicked_tooltip = last_object_clicked_tooltip.split(": ")[1]
     else:
         st.session_state.last_object_clicked_tooltip = None
+    st.session_state.destination_poi = None
     if last_object:
+        # POI cliccato, per leggere la coda aggiornata in page2
+        clicked_idx, clicked_distance = store.spatial_index.nearest(last_object['lat'], last_object['lng'])
+        if len(clicked_idx) and clicked_distance[0] < 1:
+            st.session_state.destination_poi = poi_key(store, clicked_idx[0])
         st.write(f"Typology clicked: {last_object_clicked_popup}")
         destination_info = get_street_from_coordinates((last_object['lat'], last_object['lng']))
         st.markdown(f"**Destination:** {destination_info.split(",")[0]}")
@@ -285,6 +350,9 @@ def page1():
         st.session_state["page"] = 2
         st.rerun()
 
+    nearest_panel(store, queue, filtered_idx, selected_dataset)
+    fastest_panel(store, queue, filtered_idx, selected_dataset)
+
 
 
 def page2():
@@ -294,18 +362,15 @@ def page2():
         st.session_state.end_street = None
         st.session_state.destination_name = None
         st.session_state.last_object_clicked_tooltip = None
+        st.session_state.destination_poi = None
         st.session_state["page"] = 1
         st.rerun()
 
     # Set start location
-    if st.session_state.selected_starting_point_mode == "Simulation: Lucca 1":
-        st.session_state.start = (43.8430153,10.502204)
-    elif st.session_state.selected_starting_point_mode == "Simulation: Lucca 2":
-        st.session_state.start = (43.843, 10.508)
-    elif st.session_state.selected_starting_point_mode == "Simulation: Lucca 3":
-        st.session_state.start = (43.8408387,10.4996806)
-    else:
-        st.session_state.start = get_current_coordinates_using_IP()
+    st.session_state.start = get_start_location(st.session_state.selected_starting_point_mode, st.session_state, st.query_params)
+    if st.session_state.start is None:
+        st.error("Could not determine your location: pick a simulation starting point or allow location access.")
+        st.stop()
 
 
     # Retrieve last clicked object on the map
@@ -319,7 +384,12 @@ def page2():
         
         if st.session_state.destination_name:
             print("getting end from name")
-            st.session_state.end = get_lat_lon(st.session_state.destination_name)
+            try:
+                st.session_state.end = get_lat_lon(st.session_state.destination_name)
+            except TimeoutError:
+                st.info("Still looking up the destination address, please try again in a few seconds.")
+                st.button("Retry")
+                st.stop()
         else:
             # Get coordinates of the selected point
             print("getting end previous page")
@@ -365,27 +435,12 @@ def page2():
             icon=folium.Icon(color="green", icon="flag")
         ))
 
-        # Use GraphHopper API to calculate the route
-        graphhopper_api_key = os.getenv("GRAPHHOPPER_API_KEY")
-        if st.session_state.selected_travel_mode.lower() == "walk":
-            vehicle = "foot"
-        else:
-            vehicle = st.session_state.selected_travel_mode.lower()
-        url = (
-            f'https://graphhopper.com/api/1/route?'
-            f'point={st.session_state.start[0]},{st.session_state.start[1]}&'
-            f'point={st.session_state.end[0]},{st.session_state.end[1]}&'
-            f'type=json&locale=en&vehicle={vehicle}&key={graphhopper_api_key}'
-        )
-
+        # Calcola il percorso (GraphHopper o motore locale, vedi ROUTING_ENGINE)
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            data = get_route(st.session_state.start, st.session_state.end, get_vehicle())
 
-            # Decode the route geometry
-            encoded_polyline = data['paths'][0]['points']
-            decoded_route = polyline.decode(encoded_polyline)
+            # Route geometry, already decoded by the route cache
+            decoded_route = data['paths'][0]['coordinates']
 
 
             rt = folium.FeatureGroup(name="Route")
@@ -444,15 +499,28 @@ def page2():
             st.write(f"Total Distance: {round(total_distance, 2)} km")
             total_travel_time = round(total_duration, 2)
             st.write(f"Estimated Total Travel Time: {total_travel_time} minutes")
-            if st.session_state.last_object_clicked_tooltip is not None and st.session_state.last_object_clicked_tooltip != "None":
+            queue_state = get_queue_state()
+            destination_row = queue_state.row_of(st.session_state.get("destination_poi"))
+            if destination_row is not None and queue_state.get(st.session_state.destination_poi) is not None:
+                # Coda attuale e coda prevista al momento dell'arrivo
+                expected_queue, queue_minutes = queue_state.predict_wait(
+                    np.array([destination_row]), np.array([total_duration * 60]), MINUTES_PER_PERSON)
+                st.write(f"Queue: {queue_state.get(st.session_state.destination_poi)} people now, "
+                         f"about {round(expected_queue[0])} expected when you arrive")
+                total_queue_time = round(float(queue_minutes[0]), 1)
+                st.write(f"Estimated Total queue time: {total_queue_time} minutes")
+                st.write(f"Estimated Total time: {round(total_queue_time + total_travel_time, 2)} minutes")
+            elif st.session_state.last_object_clicked_tooltip is not None and st.session_state.last_object_clicked_tooltip != "None":
                 st.write(f"Queue: {st.session_state.last_object_clicked_tooltip} people")
-                total_queue_time = int(st.session_state.last_object_clicked_tooltip)
+                total_queue_time = int(st.session_state.last_object_clicked_tooltip) * MINUTES_PER_PERSON
                 st.write(f"Estimated Total queue time: {total_queue_time} minutes (1 person per minute)")
                 st.write(f"Estimated Total time: {total_queue_time + total_travel_time} minutes")
         except requests.exceptions.RequestException as e:
             st.error(f"Failed to retrieve route data: check the route start and destination points: {st.session_state.start_street} and {st.session_state.end_street}")
         except KeyError:
             st.error("Unexpected response structure from the API.")
+        except RoutingError as e:
+            st.error(f"Failed to compute the route: {e}")
     else:
         st.warning("Please click on the map to select a destination.")
 
@@ -460,16 +528,28 @@ def page2():
 
 def main():
     st.title("🌍 Navigator")
+    if QUEUE_SIMULATION:
+        start_simulation()
 
     st.sidebar.title("Filters")
+    # Con ?lat=...&lon=... nell'URL (ricarica o link condiviso) si parte dalla posizione del browser
     st.session_state.selected_starting_point_mode = st.sidebar.selectbox(
         "Select starting point (simulation)",
-        options=["Simulation: Lucca 1", "Simulation: Lucca 2", "Simulation: Lucca 3", "Use IP location"]
+        options=STARTING_POINT_MODES,
+        index=STARTING_POINT_MODES.index(BROWSER_LOCATION) if get_browser_location(st.query_params) else 0
     )
+    if st.session_state.selected_starting_point_mode == BROWSER_LOCATION:
+        error = request_browser_location(st.query_params)
+        if error:
+            st.sidebar.warning(f"Browser location not available: {error}")
     st.session_state.selected_travel_mode = st.sidebar.selectbox(
         "Select travel mode",
         options=["Walk", "Car", "Bike", "Scooter"]
     )
+    st.session_state.marker_rendering = st.sidebar.selectbox(
+        "Marker rendering",
+        options=["Auto", "Clustered", "Individual markers"]
+    )
 
     if "page" not in st.session_state:
         st.session_state["page"] = 1
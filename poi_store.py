@@ -0,0 +1,160 @@
+import os
+import json
+import threading
+import numpy as np
+from spatial_index import SpatialIndex
+
+# Valore usato per i POI senza la proprieta' "queue"
+QUEUE_MISSING = -1
+DEFAULT_AMENITY = "Sconosciuto"
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class POIStore:
+    """
+    Columnar, read-only view of a POI GeoJSON file.
+
+    Every column is a NumPy array with one entry per feature, so the
+    navigator pages can filter and slice without touching the raw
+    GeoJSON dicts.
+    """
+
+    def __init__(self, path, mtime, ids, lat, lon, amenity, name, queue, materials):
+        self.path = path
+        self.mtime = mtime
+        self.ids = ids
+        self.lat = lat
+        self.lon = lon
+        self.amenity = amenity
+        self.name = name
+        self.queue = queue
+        self.materials = materials
+        self.center = [float(lat.mean()), float(lon.mean())] if len(lat) else [0.0, 0.0]
+
+        # Indici invertiti: valore -> maschera booleana delle righe
+        self.amenity_index = _build_index((a,) for a in amenity)
+        self.material_index = _build_index(materials)
+        self.amenities = list(self.amenity_index)
+        self.materials_list = sorted(self.material_index)
+        self._spatial_index = None
+
+    def __len__(self):
+        return len(self.lat)
+
+    @property
+    def spatial_index(self):
+        """Grid index over the store coordinates, built on first use."""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.lat, self.lon)
+        return self._spatial_index
+
+    def amenity_mask(self, selected_amenities):
+        """Rows whose amenity is one of the selected ones."""
+        return _or_masks(self.amenity_index, selected_amenities, len(self))
+
+    def material_mask(self, selected_materials):
+        """Rows accepting at least one of the selected materials."""
+        return _or_masks(self.material_index, selected_materials, len(self))
+
+    def materials_in(self, mask):
+        """Sorted list of the materials present in the rows selected by mask."""
+        return [mat for mat in self.materials_list if np.any(self.material_index[mat] & mask)]
+
+    @classmethod
+    def from_geojson(cls, path):
+        """
+        Parse a GeoJSON FeatureCollection of points into a POIStore.
+
+        Args:
+            path (str): Path to the GeoJSON file
+
+        Returns:
+            POIStore: The columnar store
+        """
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as f:
+            geojson_data = json.load(f)
+        return cls.from_features(geojson_data["features"], path, mtime)
+
+    @classmethod
+    def from_features(cls, features, path=None, mtime=None):
+        """
+        Build a POIStore from a list of GeoJSON point features.
+
+        Args:
+            features (list): GeoJSON features
+            path (str): Source file, if any
+            mtime (float): Modification time of the source file, if any
+
+        Returns:
+            POIStore: The columnar store
+        """
+        n = len(features)
+        ids = np.empty(n, dtype=object)
+        lat = np.empty(n, dtype=np.float64)
+        lon = np.empty(n, dtype=np.float64)
+        amenity = np.empty(n, dtype=object)
+        name = np.empty(n, dtype=object)
+        queue = np.full(n, QUEUE_MISSING, dtype=np.int64)
+        materials = np.empty(n, dtype=object)
+
+        for i, feature in enumerate(features):
+            properties = feature["properties"]
+            coordinates = feature["geometry"]["coordinates"]
+            ids[i] = properties.get("@id", feature.get("id", ""))
+            lon[i] = coordinates[0]
+            lat[i] = coordinates[1]
+            amenity[i] = properties.get("amenity", DEFAULT_AMENITY)
+            name[i] = properties.get("name", "")
+            if properties.get("queue") is not None:
+                queue[i] = int(properties["queue"])
+            materials[i] = tuple(properties.get("materials", ()))
+
+        return cls(path, mtime, ids, lat, lon, amenity, name, queue, materials)
+
+
+def _build_index(values_per_row):
+    rows_per_value = {}
+    n = 0
+    for i, values in enumerate(values_per_row):
+        for value in values:
+            rows_per_value.setdefault(value, []).append(i)
+        n = i + 1
+    index = {}
+    for value, rows in rows_per_value.items():
+        mask = np.zeros(n, dtype=bool)
+        mask[rows] = True
+        index[value] = mask
+    return index
+
+
+def _or_masks(index, selected, n):
+    mask = np.zeros(n, dtype=bool)
+    for value in selected:
+        if value in index:
+            mask |= index[value]
+    return mask
+
+
+def get_poi_store(path):
+    """
+    Return the POIStore for a GeoJSON file, loading it at most once per process.
+
+    The store is shared by every Streamlit session and reloaded only when
+    the file modification time changes.
+
+    Args:
+        path (str): Path to the GeoJSON file
+
+    Returns:
+        POIStore: The cached store
+    """
+    mtime = os.path.getmtime(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None or store.mtime != mtime:
+            store = POIStore.from_geojson(path)
+            _stores[path] = store
+        return store
@@ -0,0 +1,56 @@
+import sqlite3
+from geocoding import geocode_async
+
+DB_PATH = "event.db"
+
+
+def get_stand_addresses(db_path=DB_PATH):
+    """
+    Read the address of every stand in the event database.
+
+    Args:
+        db_path (str): Path to the SQLite database
+
+    Returns:
+        list: Distinct, non-empty stand positions
+    """
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT DISTINCT position FROM stand WHERE position IS NOT NULL AND position != ''").fetchall()
+    return [row[0] for row in rows]
+
+
+def prewarm(addresses):
+    """
+    Geocode every address into the shared cache.
+
+    Lookups go through the same rate-limited queue as the app, so this
+    takes about one second per address that is not cached yet.
+
+    Args:
+        addresses (list): Stand addresses, as typed in the navigator
+
+    Returns:
+        dict: Address -> (latitude, longitude), or None if not found
+    """
+    # Stessa query di navigator.get_lat_lon, cosi' la chiave in cache coincide
+    futures = {address: geocode_async(address + ", lucca") for address in addresses}
+    results = {}
+    for address, future in futures.items():
+        try:
+            results[address] = future.result()
+        except Exception as e:
+            print(f"Failed to geocode {address}: {e}")
+            results[address] = None
+        print(f"{address}: {results[address]}")
+    return results
+
+
+def main():
+    addresses = get_stand_addresses()
+    results = prewarm(addresses)
+    found = sum(1 for coordinates in results.values() if coordinates)
+    print(f"Geocoded {found}/{len(addresses)} stand addresses.")
+
+
+if __name__ == '__main__':
+    main()
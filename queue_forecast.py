@@ -0,0 +1,121 @@
+import os
+import math
+import numpy as np
+
+# Costante di tempo (secondi) delle medie mobili esponenziali
+EWMA_TAU = float(os.getenv("QUEUE_EWMA_TAU", 10 * 60))
+# Il ritmo di servizio cambia poco nel tempo: media piu' lunga, meno rumore sulla varianza
+SERVICE_TAU = float(os.getenv("QUEUE_SERVICE_TAU", 60 * 60))
+# Sotto questo ritmo (persone/minuto) la stima del servizio non e' affidabile
+MIN_SERVICE_RATE = 0.05
+# Intervalli con coda mai vuota necessari prima di usare la stima del servizio
+MIN_BUSY_OBSERVATIONS = 20
+# Coda minima all'inizio di un intervallo perche' non si svuoti prima della lettura successiva
+BUSY_MIN_QUEUE = 3
+
+
+class QueueForecaster:
+    """
+    Online per-POI queue model, one row per QueueState row.
+
+    Each observation updates, in O(1), time-weighted EWMAs in people per
+    minute. The net drift of the queue (arrivals minus departures) drives
+    the prediction. Arrivals and departures are not observed separately,
+    only the change of the count; over intervals that start with at least
+    BUSY_MIN_QUEUE people waiting they are modeled as independent Poisson counts, so the mean
+    of the change per minute is arrival - service and its variance is
+    arrival + service. The two moments give both rates, and the service
+    rate gives the minutes per person. The weight of an observation grows
+    with the time since the previous one (alpha = 1 - exp(-dt / EWMA_TAU)),
+    so the estimates do not depend on how often the sensors report.
+
+    Predictions are pure NumPy over arrays of rows, so hundreds of POIs are
+    ranked in one call.
+    """
+
+    def __init__(self, capacity, tau=EWMA_TAU, service_tau=SERVICE_TAU):
+        self.tau = tau
+        self.service_tau = service_tau
+        self.drift = np.zeros(0)
+        self.busy_drift = np.zeros(0)
+        self.busy_variance = np.zeros(0)
+        self.busy_weight = np.zeros(0)
+        self.busy_observations = np.zeros(0, dtype=np.int64)
+        self.last_time = np.zeros(0)
+        self.last_count = np.zeros(0, dtype=np.int64)
+        self.observations = np.zeros(0, dtype=np.int64)
+        self.resize(capacity)
+
+    def resize(self, capacity):
+        n = len(self.drift)
+        for name in ("drift", "busy_drift", "busy_variance", "busy_weight", "busy_observations", "last_time", "last_count",
+                     "observations"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+
+    def observe(self, row, count, timestamp):
+        """Update the model of a row with a new (count, timestamp) observation."""
+        if self.observations[row]:
+            dt = timestamp - self.last_time[row]
+            if dt <= 0:
+                self.last_count[row] = count
+                return
+            alpha = 1.0 - math.exp(-dt / self.tau)
+            minutes = dt / 60
+            delta = count - self.last_count[row]
+            self.drift[row] += alpha * (delta / minutes - self.drift[row])
+            if self.last_count[row] >= BUSY_MIN_QUEUE:
+                # Coda che non si svuota: servizio continuo, momenti non troncati dallo zero.
+                # Si seleziona solo sul conteggio iniziale: scartare gli intervalli finiti a zero
+                # toglierebbe proprio le diminuzioni piu' grandi
+                # Peso totale accumulato: corregge la partenza da zero delle medie
+                alpha = 1.0 - math.exp(-dt / self.service_tau)
+                self.busy_weight[row] += alpha * (1 - self.busy_weight[row])
+                mean = self.busy_drift[row] / self.busy_weight[row] if self.busy_observations[row] else delta / minutes
+                deviation = delta - mean * minutes
+                self.busy_drift[row] += alpha * (delta / minutes - self.busy_drift[row])
+                self.busy_variance[row] += alpha * (deviation * deviation / minutes - self.busy_variance[row])
+                self.busy_observations[row] += 1
+        self.last_time[row] = timestamp
+        self.last_count[row] = count
+        self.observations[row] += 1
+
+    def predict(self, rows, current, eta, now):
+        """
+        Expected queue length when a visitor arrives.
+
+        Args:
+            rows (np.ndarray): QueueState rows
+            current (np.ndarray): Current queue length of the rows
+            eta (np.ndarray): Seconds until the visitor arrives (inf if unreachable)
+            now (float): Current time
+
+        Returns:
+            np.ndarray: Predicted queue lengths (float, never negative)
+        """
+        # L'ultima osservazione puo' essere vecchia: si proietta dal suo istante
+        elapsed = np.where(self.observations[rows] > 0, np.maximum(now - self.last_time[rows], 0), 0)
+        horizon = (elapsed + np.where(np.isfinite(eta), eta, 0)) / 60
+        return np.maximum(current + self.drift[rows] * horizon, 0)
+
+    def _busy_moments(self, rows):
+        weight = np.maximum(self.busy_weight[rows], 1e-12)
+        return self.busy_drift[rows] / weight, self.busy_variance[rows] / weight
+
+    def service_rate(self, rows):
+        """Estimated departures per minute while people are waiting: (variance - drift) / 2."""
+        drift, variance = self._busy_moments(rows)
+        return np.maximum((variance - drift) / 2, 0)
+
+    def arrival_rate(self, rows):
+        """Estimated arrivals per minute: (variance + drift) / 2."""
+        drift, variance = self._busy_moments(rows)
+        return np.maximum((variance + drift) / 2, 0)
+
+    def minutes_per_person(self, rows, default):
+        """Estimated service time per person, `default` where the rate is not known yet."""
+        service = self.service_rate(rows)
+        known = (self.busy_observations[rows] >= MIN_BUSY_OBSERVATIONS) & (service > MIN_SERVICE_RATE)
+        return np.where(known, 1 / np.maximum(service, MIN_SERVICE_RATE), default)
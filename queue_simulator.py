@@ -0,0 +1,122 @@
+import os
+import time
+import argparse
+import threading
+import numpy as np
+from poi_store import get_poi_store, QUEUE_MISSING
+from queue_state import QueueState, get_queue_state, poi_key
+
+# Con QUEUE_SIMULATION=1 il navigator avvia il simulatore dentro il processo di Streamlit
+QUEUE_SIMULATION = os.getenv("QUEUE_SIMULATION", "0") == "1"
+TOILETS_FILE = 'data/servizi_pubblici_lucca.geojson'
+# Aggiornamenti al secondo generati in totale
+DEFAULT_RATE = 2000
+BATCH_SIZE = 100
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+class QueueSimulator(threading.Thread):
+    """
+    Load generator standing in for the door sensors.
+
+    Every POI gets its own arrival and service rate (people per minute);
+    each update advances one random POI by a random walk of Poisson
+    arrivals and departures and reports the new count to the QueueState.
+    Updates are sent in batches of BATCH_SIZE, paced to `rate` per second.
+    """
+
+    def __init__(self, state, ids, initial=None, rate=DEFAULT_RATE, batch_size=BATCH_SIZE, seed=None):
+        super().__init__(name="queue-simulator", daemon=True)
+        self.state = state
+        # Lista e non array: le chiavi di QueueState possono essere tuple
+        self.ids = list(ids)
+        self.rate = rate
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        n = len(self.ids)
+        self.counts = np.zeros(n, dtype=np.int64) if initial is None else np.maximum(np.asarray(initial), 0)
+        self.arrival_rate = self.rng.uniform(0.2, 1.5, n)
+        self.service_rate = self.rng.uniform(0.5, 1.2, n)
+        self.last_update = np.full(n, time.time())
+        self.sent = 0
+        self._stopped = threading.Event()
+
+    def step(self):
+        """Generate and send one batch of updates."""
+        now = time.time()
+        pois = self.rng.integers(0, len(self.ids), self.batch_size)
+        for i in pois:
+            minutes = (now - self.last_update[i]) / 60
+            arrivals = self.rng.poisson(self.arrival_rate[i] * minutes)
+            departures = self.rng.poisson(self.service_rate[i] * minutes)
+            self.counts[i] = max(self.counts[i] + arrivals - departures, 0)
+            self.last_update[i] = now
+        self.state.update_many((self.ids[i], self.counts[i], now) for i in pois)
+        self.sent += len(pois)
+
+    def run(self):
+        interval = self.batch_size / self.rate
+        next_batch = time.monotonic()
+        while not self._stopped.is_set():
+            self.step()
+            next_batch += interval
+            wait = next_batch - time.monotonic()
+            if wait > 0:
+                self._stopped.wait(wait)
+            else:
+                # In ritardo: non recuperare i batch persi
+                next_batch = time.monotonic()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_simulation(path=TOILETS_FILE, rate=DEFAULT_RATE):
+    """Start (once per process) the simulator on the POIs of a GeoJSON file."""
+    global _simulator
+    with _simulator_lock:
+        if _simulator is None:
+            store = get_poi_store(path)
+            known = np.flatnonzero(store.queue != QUEUE_MISSING)
+            _simulator = QueueSimulator(get_queue_state(), [poi_key(store, i) for i in known], store.queue[known], rate=rate)
+            _simulator.start()
+        return _simulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive synthetic queue updates into a QueueState and report the throughput")
+    parser.add_argument("--pois", type=int, default=500, help="Number of simulated POIs")
+    parser.add_argument("--rate", type=float, default=20000, help="Target updates per second")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds to run")
+    args = parser.parse_args()
+
+    state = QueueState()
+    ids = [f"node/{i}" for i in range(args.pois)]
+    rows = state.register(ids)
+    simulator = QueueSimulator(state, ids, rate=args.rate, seed=0)
+    simulator.start()
+
+    # Lettore concorrente, come una pagina del navigator che ridisegna la mappa
+    reads = 0
+    read_time = 0.0
+    end = time.monotonic() + args.duration
+    while time.monotonic() < end:
+        t = time.perf_counter()
+        state.current_at(rows)
+        read_time += time.perf_counter() - t
+        reads += 1
+        time.sleep(0.01)
+    simulator.stop()
+    simulator.join()
+
+    print(f"{simulator.sent} updates in {args.duration:.0f}s: {simulator.sent / args.duration:,.0f} updates/s "
+          f"(target {args.rate:,.0f})")
+    print(f"Read of {args.pois} queue lengths: {read_time / reads * 1e6:.1f} us on average")
+    times, counts = state.history(ids[0])
+    print(f"History of {ids[0]}: {len(counts)} observations, last counts {counts[-5:].tolist()}")
+
+
+if __name__ == "__main__":
+    main()
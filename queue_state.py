@@ -0,0 +1,212 @@
+import os
+import time
+import threading
+import numpy as np
+from poi_store import QUEUE_MISSING
+from queue_forecast import QueueForecaster
+
+# Osservazioni conservate per ogni POI (le piu' vecchie vengono sovrascritte)
+HISTORY_SIZE = int(os.getenv("QUEUE_HISTORY_SIZE", 256))
+INITIAL_CAPACITY = 1024
+
+_state = None
+_state_lock = threading.Lock()
+_store_rows = {}
+
+
+class QueueState:
+    """
+    In-memory queue lengths of every POI, keyed by poi_key().
+
+    Each POI owns one row of fixed-size ring buffers holding its last
+    HISTORY_SIZE (timestamp, count) observations, plus the current count,
+    so an update and a read are both O(1) and memory does not grow with
+    the update rate. Rows are never reused: the row of a POI can be cached
+    by callers and read without a dict lookup.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE, capacity=INITIAL_CAPACITY):
+        self.history_size = history_size
+        self._rows = {}
+        self._lock = threading.Lock()
+        self.forecast = QueueForecaster(0)
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, "current", None)
+        n = 0 if old is None else len(old)
+        current = np.full(capacity, QUEUE_MISSING, dtype=np.int64)
+        counts = np.zeros((capacity, self.history_size), dtype=np.int32)
+        times = np.zeros((capacity, self.history_size), dtype=np.float64)
+        heads = np.zeros(capacity, dtype=np.int64)
+        sizes = np.zeros(capacity, dtype=np.int64)
+        if n:
+            current[:n] = old
+            counts[:n] = self.counts
+            times[:n] = self.times
+            heads[:n] = self.heads
+            sizes[:n] = self.sizes
+        self.forecast.resize(capacity)
+        self.counts = counts
+        self.times = times
+        self.heads = heads
+        self.sizes = sizes
+        # Assegnato per ultimo: i lettori senza lock vedono sempre array completi
+        self.current = current
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row(self, poi_id):
+        row = self._rows.get(poi_id)
+        if row is None:
+            row = len(self._rows)
+            if row == len(self.current):
+                self._allocate(2 * row)
+            self._rows[poi_id] = row
+        return row
+
+    def _record(self, row, count, timestamp):
+        head = self.heads[row]
+        self.counts[row, head] = count
+        self.times[row, head] = timestamp
+        self.heads[row] = (head + 1) % self.history_size
+        self.sizes[row] = min(self.sizes[row] + 1, self.history_size)
+        self.current[row] = count
+        self.forecast.observe(row, count, timestamp)
+
+    def update(self, poi_id, count, timestamp=None):
+        """
+        Record the queue length reported for a POI.
+
+        Args:
+            poi_id (tuple): The POI key, see poi_key()
+            count (int): People in the queue
+            timestamp (float): Time of the observation, defaults to now
+        """
+        with self._lock:
+            self._record(self._row(poi_id), max(int(count), 0), time.time() if timestamp is None else timestamp)
+
+    def update_many(self, updates):
+        """Record a batch of (poi_id, count, timestamp) observations under one lock."""
+        now = time.time()
+        with self._lock:
+            for poi_id, count, timestamp in updates:
+                self._record(self._row(poi_id), max(int(count), 0), now if timestamp is None else timestamp)
+
+    def register(self, ids, counts=None):
+        """
+        Rows of a list of POIs, creating the missing ones.
+
+        POIs without observations yet start with the matching entry of
+        counts (QUEUE_MISSING entries are left without observations); POIs
+        already reported keep their live state.
+
+        Returns:
+            np.ndarray: The row of each POI
+        """
+        now = time.time()
+        with self._lock:
+            rows = np.empty(len(ids), dtype=np.int64)
+            for i, poi_id in enumerate(ids):
+                rows[i] = self._row(poi_id)
+                if self.sizes[rows[i]] == 0 and counts is not None and counts[i] != QUEUE_MISSING:
+                    self._record(rows[i], counts[i], now)
+            return rows
+
+    def current_at(self, rows):
+        """Current queue length of the given rows, QUEUE_MISSING if never reported."""
+        return self.current[rows]
+
+    def predict_wait(self, rows, eta, default_minutes_per_person, now=None):
+        """
+        Queue a visitor should find on arrival, and how long it takes to clear.
+
+        Args:
+            rows (np.ndarray): Rows of the POIs (all must have a known queue)
+            eta (np.ndarray): Seconds until the visitor reaches each POI
+            default_minutes_per_person (float): Service time used until the
+                POI service rate has been estimated
+            now (float): Current time, defaults to now
+
+        Returns:
+            tuple: (predicted queue lengths, queue minutes) arrays
+        """
+        now = time.time() if now is None else now
+        predicted = self.forecast.predict(rows, self.current[rows], eta, now)
+        return predicted, predicted * self.forecast.minutes_per_person(rows, default_minutes_per_person)
+
+    def row_of(self, poi_id):
+        """Row of a POI, None if it was never registered."""
+        return self._rows.get(poi_id)
+
+    def get(self, poi_id):
+        """Current queue length of a POI, None if it was never reported."""
+        row = self._rows.get(poi_id)
+        if row is None or self.current[row] == QUEUE_MISSING:
+            return None
+        return int(self.current[row])
+
+    def history(self, poi_id):
+        """
+        Recent observations of a POI, oldest first.
+
+        Returns:
+            tuple: (timestamps, counts) arrays, empty if the POI is unknown
+        """
+        with self._lock:
+            row = self._rows.get(poi_id)
+            if row is None:
+                return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int32)
+            size = self.sizes[row]
+            order = (self.heads[row] - size + np.arange(size)) % self.history_size
+            return self.times[row, order].copy(), self.counts[row, order].copy()
+
+
+def poi_key(store, i):
+    """
+    QueueState key of the i-th POI of a POIStore.
+
+    "@id" values are unique only within a dataset (the same OSM node can
+    be both a toilet and a restaurant), so the key includes the file.
+    """
+    return (store.path, store.ids[i])
+
+
+def get_queue_state():
+    """The QueueState shared by the whole process."""
+    global _state
+    with _state_lock:
+        if _state is None:
+            _state = QueueState()
+        return _state
+
+
+def get_queue_rows(store):
+    """
+    QueueState rows of the POIs of a POIStore, aligned with the store rows.
+
+    The first call registers the store POIs, seeded with the queue values
+    of the file.
+    """
+    key = (store.path, store.mtime)
+    with _state_lock:
+        rows = _store_rows.get(key)
+    if rows is None:
+        rows = get_queue_state().register([poi_key(store, i) for i in range(len(store.ids))], store.queue)
+        with _state_lock:
+            _store_rows[key] = rows
+    return rows
+
+
+def get_live_queue(store):
+    """
+    Current queue length of every POI of a POIStore, aligned with its rows.
+
+    Args:
+        store (POIStore): The POI store
+
+    Returns:
+        np.ndarray: Queue lengths, QUEUE_MISSING where unknown
+    """
+    return get_queue_state().current_at(get_queue_rows(store))
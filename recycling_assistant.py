@@ -1,10 +1,30 @@
 import streamlit as st
 import json
 import base64
-import requests
+import time
+import http_client
 import os
 import utils
 from streamlit_card import card
+from bin_index import get_bin_index, split_items
+from advice_cache import get_advice_cache
+from image_cache import get_image_cache
+from image_preprocess import prepare_image
+from local_vision import get_local_classifier, LOCAL_VISION_THRESHOLD
+from advice_schema import ADVICE_SCHEMA, iter_advice_records
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# "per_item": una richiesta per oggetto, in parallelo; "combined": un'unica richiesta per tutti
+RECYCLING_ADVICE_MODE = os.getenv("RECYCLING_ADVICE_MODE", "per_item").lower()
+# Richieste contemporanee al modello, condivise da tutte le sessioni
+ADVICE_WORKERS = int(os.getenv("RECYCLING_ADVICE_WORKERS", 4))
+# "json": oggetti con chiavi brevi e id dei bidoni (advice_schema.py); "text": blocchi "- Item Name: ..."
+RECYCLING_ADVICE_FORMAT = os.getenv("RECYCLING_ADVICE_FORMAT", "json").lower()
+MAX_NEW_TOKENS = 500
+# Un blocco per un solo oggetto sta ampiamente in questo limite
+ITEM_MAX_NEW_TOKENS = 250
+
+_advice_pool = ThreadPoolExecutor(max_workers=ADVICE_WORKERS, thread_name_prefix="recycling-advice")
 
 # Function to load the recycling data
 def load_recycling_data():
@@ -18,11 +38,16 @@ def load_recycling_data():
         return None
 
 # Function to analyze the picture taken from the camera
-def analyze_image(image_data):
+def analyze_image(image_data, preprocess=True):
     try:
         # Encode image to base64
-        base64_image = base64.b64encode(image_data.getvalue()).decode('utf-8')
-        # print(base64_image)
+        if preprocess:
+            # Ridimensionata e ricompressa: meno byte da caricare e da elaborare per il modello
+            base64_image, stats = prepare_image(image_data.getvalue())
+        else:
+            base64_image = base64.b64encode(image_data.getvalue()).decode('utf-8')
+            stats = {"mime": "image/jpeg"}
+        start = time.perf_counter()
         prompt = """
         You are a waste sorting assistant that identifies items based on established recycling categories. Identify items precisely to help users determine the correct disposal method.
         Analyze this image and identify items.
@@ -35,12 +60,12 @@ def analyze_image(image_data):
         "glass wine bottle, plastic yogurt container, banana peel, cardboard box"
         """
 
-        response = requests.post(
-            url = "https://eu-de.ml.cloud.ibm.com/ml/v1/text/chat?version=2023-05-29",
+        response = http_client.post(
+            url = f"{utils.WATSONX_URL}/ml/v1/text/chat?version=2023-05-29",
             headers={
                 "Accept": "application/json",
                 "Content-Type": "application/json",
-                "Authorization": f"Bearer {utils.API_TOKEN}"
+                "Authorization": f"Bearer {utils.get_api_token()}"
             },
             json={
                 "messages": [
@@ -57,7 +82,7 @@ def analyze_image(image_data):
                             "type": "image_url",
                             "image_url": {
                                 "url":
-                                f"data:image/jpeg;base64, {base64_image}"
+                                f"data:{stats['mime']};base64, {base64_image}"
                             }
                         }]
                     }
@@ -70,14 +95,20 @@ def analyze_image(image_data):
             })
 
         data = response.json()
+        if preprocess:
+            print(f"analyze_image: {stats['original_bytes']} -> {stats['sent_bytes']} bytes "
+                  f"({stats['saved_bytes']} saved, {stats['size'][0]}x{stats['size'][1]}), "
+                  f"preprocessing {stats['elapsed_ms']:.1f} ms, model {(time.perf_counter() - start) * 1000:.0f} ms")
         return data['choices'][0]['message']['content']
 
     except Exception as e:
         return f"Error analyzing image: {str(e)}"
 
 
-def get_recycling_advice(context, items):
-    prompt = f"""
+def build_recycling_prompt(context, items, response_format=RECYCLING_ADVICE_FORMAT):
+    if response_format == "json":
+        return build_recycling_prompt_json(context, items)
+    return f"""
     You are a specialized recycling assistant with deep knowledge of waste sorting.
     Your goal is to provide accurate, practical advice that helps users correctly dispose of items.
     Always prioritize environmental safety and proper waste separation.
@@ -116,13 +147,48 @@ def get_recycling_advice(context, items):
     - Please format your response clearly and concisely for each item and do not use <|eom_id|>.
     """
 
-    url = "https://eu-de.ml.cloud.ibm.com/ml/v1/text/generation?version=2023-05-29"
 
-    body = {
+def build_recycling_prompt_json(context, items):
+    return f"""
+    You are a recycling expert assistant. Using the provided recycling guidelines, analyze these items: {items} Context (recycling guidelines):
+    {context}
+
+    Answer only with a JSON array, one object per item, following this JSON schema:
+    {json.dumps(ADVICE_SCHEMA, separators=(",", ":"))}
+    "b" is the key of the bin in the guidelines. If an item isn't in the guidelines, choose the safest disposal method.
+    Keep "p", "r" and "s" to one short sentence each. No text before or after the array.
+    """
+
+
+def identify_items(img_file):
+    # Foto identiche o quasi (rerun, stesso oggetto riscattato) riusano l'identificazione precedente
+    image_cache = get_image_cache()
+    key = image_cache.key(img_file.getvalue())
+    identified_items, distance = image_cache.get(key)
+    if identified_items is not None:
+        print(f"Image cache hit (distance {distance})")
+        return identified_items
+    # Rifiuti comuni riconosciuti con sicurezza dal classificatore locale, senza pixtral
+    classifier = get_local_classifier()
+    if classifier is not None:
+        prediction = classifier.classify(img_file.getvalue())
+        print(f"Local vision: {prediction['label']} -> {prediction['item']} "
+              f"({prediction['confidence']:.2f}, {prediction['elapsed_ms']:.0f} ms)")
+        if prediction["item"] is not None and prediction["confidence"] >= LOCAL_VISION_THRESHOLD:
+            image_cache.set(key, prediction["item"])
+            return prediction["item"]
+    identified_items = analyze_image(img_file)
+    if isinstance(identified_items, str) and not identified_items.startswith("Error"):
+        image_cache.set(key, identified_items)
+    return identified_items
+
+
+def generation_body(prompt, max_new_tokens=MAX_NEW_TOKENS):
+    return {
         "input": prompt,
         "parameters": {
             "decoding_method": "greedy",
-            "max_new_tokens": 500,
+            "max_new_tokens": max_new_tokens,
             "min_new_tokens": 0,
             "repetition_penalty": 1
         },
@@ -164,13 +230,21 @@ def get_recycling_advice(context, items):
         }
     }
 
+
+def get_recycling_advice(context, items, max_new_tokens=MAX_NEW_TOKENS, response_format=RECYCLING_ADVICE_FORMAT):
+    prompt = build_recycling_prompt(context, items, response_format)
+
+    url = f"{utils.WATSONX_URL}/ml/v1/text/generation?version=2023-05-29"
+
+    body = generation_body(prompt, max_new_tokens)
+
     headers = {
         "Accept": "application/json",
         "Content-Type": "application/json",
-        "Authorization": "Bearer " + utils.API_TOKEN
+        "Authorization": "Bearer " + utils.get_api_token()
     }
 
-    response = requests.post(url, headers=headers, json=body)
+    response = http_client.post(url, headers=headers, json=body)
 
     if response.status_code != 200:
         raise Exception("Non-200 response: " + str(response.text))
@@ -179,7 +253,58 @@ def get_recycling_advice(context, items):
     return data['results'][0]['generated_text']
 
 
+def stream_recycling_advice(context, items, max_new_tokens=MAX_NEW_TOKENS, response_format=RECYCLING_ADVICE_FORMAT):
+    """Same request as get_recycling_advice, yielding the generated text as it arrives."""
+    prompt = build_recycling_prompt(context, items, response_format)
+
+    url = f"{utils.WATSONX_URL}/ml/v1/text/generation_stream?version=2023-05-29"
+
+    headers = {
+        "Accept": "text/event-stream",
+        "Content-Type": "application/json",
+        "Authorization": "Bearer " + utils.get_api_token()
+    }
+
+    for event in http_client.stream_events("POST", url, headers=headers, json=generation_body(prompt, max_new_tokens)):
+        for result in event.get("results", []):
+            yield result.get("generated_text", "")
+
+
+def get_item_advice(bin_index, item):
+    """
+    Advice for a single item, with only the bins relevant to it as context.
+
+    With WATSONX_STREAMING the response is streamed and the stream is
+    closed as soon as the first block is complete, so the card is ready
+    before the model has finished generating.
+
+    Runs on the advice thread pool: it must not call Streamlit.
+
+    Returns:
+        dict: Card fields of the first complete block of the response
+    """
+    context = json.dumps(bin_index.relevant_context([item]))
+    if utils.WATSONX_STREAMING:
+        chunks = utils.report_first_token(stream_recycling_advice(context, item, ITEM_MAX_NEW_TOKENS),
+                                          f"Recycling advice ({item})")
+    else:
+        chunks = [get_recycling_advice(context, item, ITEM_MAX_NEW_TOKENS)]
+    errors = []
+    advice_stream = iter_advice(chunks)
+    try:
+        for advice, error in advice_stream:
+            if advice is not None:
+                return advice
+            errors.append(str(error))
+    finally:
+        # Chiude la connessione: il resto della risposta non serve
+        advice_stream.close()
+    raise ValueError(f"No advice in the response for {item}: {'; '.join(errors) or 'empty response'}")
+
+
 def get_bin_image(waste_type):
+    # Serve un'immagine esistente per ogni chiave di data.json: le schede locali di BinIndex
+    # usano quelle chiavi come "Correct Bin", e st.image fallisce con None o con un file mancante
     bin_images = {
         "battery_symbol": "images/battery_symbol.png",
         "blue": "images/blu.png",
@@ -187,9 +312,10 @@ def get_bin_image(waste_type):
         "green": "images/green.png",
         "yellow": "images/yellow.png",
         "grey": "images/grey.png",
-        "oil_symbol": "images/oil_symbol.png",
+        "oil_symbol": "images/oil_symbol.jpg",
         "red": "images/red.png",
         "farmacie": "images/farmacie.jpg",
+        "white_with_green_cross": "images/white_with_green_cross.png",
         "yellow_street": "images/yellow_street.png",
         "none": "images/none.png",
         "N/A": "images/none.png"
@@ -230,6 +356,101 @@ def get_background_gradient(color_key):
     return gradients.get(color_key, "linear-gradient(to right, #E0E0E0, #BDBDBD)")
 
 
+def parse_advice_block(recycling_advice_item):
+    advice = {}
+    for line in recycling_advice_item.splitlines():
+        line = line.strip()
+        if line:
+            if ": " in line:
+                key, value = line.split(": ", 1)
+                advice[key.lstrip("- ")] = value.strip()
+    return advice
+
+
+def iter_advice_blocks(chunks):
+    """Yield each ---------delimited block of a streamed response as soon as it is complete."""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        while '---------' in buffer:
+            block, buffer = buffer.split('---------', 1)
+            yield block
+    yield buffer
+
+
+def iter_advice(chunks, response_format=RECYCLING_ADVICE_FORMAT):
+    """
+    Card fields of each item of a (possibly streamed) response, as soon as it is complete.
+
+    Yields:
+        tuple: (advice dict, None), or (None, error) for an item that could not be parsed
+    """
+    if response_format == "json":
+        for record, error in iter_advice_records(chunks):
+            yield (record.card() if record is not None else None), error
+        return
+    for block in iter_advice_blocks(chunks):
+        advice = parse_advice_block(block)
+        if advice.get("Item Name") and advice.get("Correct Bin"):
+            yield advice, None
+        elif block.strip():
+            yield None, ValueError(f"incomplete advice block {block.strip()[:80]!r}")
+
+
+def render_advice_card(recycling_advice):
+    col1, col2 = st.columns([3, 1])
+
+    text_to_show = []
+    if recycling_advice.get('Reason'):
+        text_to_show.append("Description: " + format_text(recycling_advice['Reason']))
+    preparation = recycling_advice.get('Preparation Required', "")
+    if preparation and "none" not in preparation.lower():
+        text_to_show.append("Preparation Required: " + format_text(preparation))
+    if recycling_advice.get('Special Notes'):
+        text_to_show.append("Notes: " + format_text(recycling_advice['Special Notes']))
+
+    with col1:
+
+
+        card(
+        title=recycling_advice['Item Name'],
+        text=text_to_show,
+        styles={
+        "card": {
+            "width": "100%",
+            "height": "300px",
+            "padding": "10px",
+            "margin": "0px",
+            "border": "3px solid " + recycling_advice["Correct Bin"].lower(),
+            "pointer-events": "none",  # Disables interactions
+        },
+        "card_hover": {
+            "pointer-events": "auto",  # Riattiva solo il mouse hover
+        },
+        "filter": {
+            "background": get_background_gradient(recycling_advice["Correct Bin"]),
+            "background-color": "transparent"
+        },
+        "text": {
+            "color": "white",
+            "font-weight": "lighter",
+        }
+        }
+        )
+
+    with col2:
+        st.image(get_bin_image(recycling_advice["Correct Bin"].lower()), width=200)
+        # Le schede locali hanno il nome del bidone da data.json
+        bin_label = recycling_advice.get("Bin Label", recycling_advice["Correct Bin"])
+        st.write("<p style='text-align: center;'>" + bin_label + " bin</p>", unsafe_allow_html=True)
+
+
+def report_first_card(request_start, cards_shown):
+    # Solo la prima scheda arrivata dal modello
+    if cards_shown == 0:
+        print(f"Recycling advice: first card after {(time.perf_counter() - request_start) * 1000:.0f} ms")
+
+
 def main():
     st.title("♻️ Recycling Assistant")
 
@@ -243,7 +464,7 @@ def main():
     img_file = st.camera_input("Take a picture of the item that you would like to recycle")
     if img_file is not None:
         with st.spinner("Analyzing image..."):
-            identified_items = analyze_image(img_file)
+            identified_items = identify_items(img_file)
             if identified_items == "no items found":
                 st.error("No items found in image")
                 st.stop()
@@ -253,74 +474,63 @@ def main():
             else:
                 st.write(identified_items)
 
-                items = identified_items
-                context = json.dumps(recycling_data)
-                recycling_advice = get_recycling_advice(context, items)
-
-                print(recycling_advice)
+                # Gli oggetti presenti in data.json vengono risolti localmente, senza il modello
+                bin_index = get_bin_index()
+                local_advice = []
+                remaining_items = []
+                for item in split_items(identified_items):
+                    advice = bin_index.advice(item)
+                    if advice is not None:
+                        local_advice.append(advice)
+                    else:
+                        remaining_items.append(item)
 
                 # generate a lore for the object
                 # animate the object
 
                 st.write("### Recycling instructions")
-                recycling_advice_items = recycling_advice.split('---------')
-
-                for recycling_advice_item in recycling_advice_items:
-                    recycling_advice = {}
-                    print("recycling_advice_item:\n", recycling_advice_item)
-                    for line in recycling_advice_item.splitlines():
-                        line = line.strip()  
-                        if line:  
-                            if ": " in line: 
-                                key, value = line.split(": ", 1) 
-                                recycling_advice[key.lstrip("- ")] = value.strip()
-                    col1, col2 = st.columns([3, 1])
-
-                    text_to_show = []
-                    try:
-                        text_to_show.append("Description: " + format_text(recycling_advice['Reason']))
-                    except:
-                        pass
-                    try:
-                        if "none" not in recycling_advice.get('Preparation Required').lower():
-                            text_to_show.append("Preparation Required: " + format_text(recycling_advice['Preparation Required']))
-                    except:
-                        pass
-                    try:
-                        text_to_show.append("Notes: " + format_text(recycling_advice['Special Notes']))
-                    except:
-                        pass
-
-                    with col1:
-
-
-                        card(
-                        title=recycling_advice['Item Name'],
-                        text=text_to_show,
-                        styles={
-                        "card": {
-                            "width": "100%",
-                            "height": "300px",
-                            "padding": "10px",
-                            "margin": "0px",
-                            "border": "3px solid " + recycling_advice["Correct Bin"].lower(),
-                            "pointer-events": "none",  # Disables interactions
-                        },
-                        "card_hover": {
-                            "pointer-events": "auto",  # Riattiva solo il mouse hover
-                        },
-                        "filter": {
-                            "background": get_background_gradient(recycling_advice["Correct Bin"]),
-                            "background-color": "transparent"
-                        },
-                        "text": {
-                            "color": "white",
-                            "font-weight": "lighter",
-                        }
-                        }
-                        )
-
-                    with col2:
-                        st.image(get_bin_image(recycling_advice["Correct Bin"].lower()), width=200)
-                        st.write("<p style='text-align: center;'>" + recycling_advice["Correct Bin"] + " bin</p>", unsafe_allow_html=True)
-
+                for advice in local_advice:
+                    render_advice_card(advice)
+
+                # Consigli gia' dati per gli stessi oggetti (stessa versione di data.json)
+                advice_cache = get_advice_cache()
+                cached_advice, remaining_items = advice_cache.split(remaining_items)
+                for _, advice in cached_advice:
+                    render_advice_card(advice)
+
+                request_start = time.perf_counter()
+                cards_shown = 0
+                if remaining_items and RECYCLING_ADVICE_MODE == "per_item":
+                    # Ogni scheda appare appena il suo oggetto e' pronto
+                    futures = {_advice_pool.submit(get_item_advice, bin_index, item): item for item in remaining_items}
+                    for future in as_completed(futures):
+                        item = futures[future]
+                        try:
+                            advice = future.result()
+                        except Exception as e:
+                            st.error(f"Could not get recycling advice for {item}: {e}")
+                            continue
+                        advice_cache.set(item, advice)
+                        render_advice_card(advice)
+                        report_first_card(request_start, cards_shown)
+                        cards_shown += 1
+                elif remaining_items:
+                    items = ", ".join(remaining_items)
+                    # Solo i bidoni pertinenti, non tutto data.json
+                    context = json.dumps(bin_index.relevant_context(remaining_items))
+                    if utils.WATSONX_STREAMING:
+                        # Una scheda per ogni oggetto appena il modello lo completa
+                        chunks = utils.report_first_token(stream_recycling_advice(context, items), "Recycling advice")
+                    else:
+                        chunks = [get_recycling_advice(context, items)]
+                    parsed_advice = []
+                    for advice, error in iter_advice(chunks):
+                        if error is not None:
+                            print(f"Recycling advice: {error}")
+                            st.warning(f"Part of the answer could not be read: {error}")
+                            continue
+                        parsed_advice.append(advice)
+                        render_advice_card(advice)
+                        report_first_card(request_start, cards_shown)
+                        cards_shown += 1
+                    advice_cache.store_response(remaining_items, parsed_advice)
@@ -0,0 +1,445 @@
+import os
+import math
+import json
+import heapq
+import threading
+import numpy as np
+import polyline
+import http_client
+from cachetools import TTLCache
+from dotenv import load_dotenv
+from spatial_index import SpatialIndex
+from street_index import STREETS_FILE
+
+load_dotenv()
+
+# "graphhopper": API remota, "local": grafo stradale locale (data/strade_lucca.geojson)
+ROUTING_ENGINE = os.getenv("ROUTING_ENGINE", "graphhopper").lower()
+GRAPHHOPPER_URL = "https://graphhopper.com/api/1/route"
+REQUEST_TIMEOUT = 15
+# Percorsi in memoria, condivisi tra le sessioni
+ROUTE_CACHE_SIZE = 2000
+ROUTE_CACHE_TTL = 15 * 60
+# 4 decimali ~ 11 m: partenze/arrivi quasi identici condividono il percorso
+SNAP_DECIMALS = 4
+# Alberi dei tempi di percorrenza da una partenza (uno-a-molti)
+TRAVEL_TIMES_CACHE_SIZE = 200
+# Senza grafo locale: distanza in linea d'aria * fattore di deviazione, alla velocita' del veicolo
+DETOUR_FACTOR = 1.3
+FALLBACK_SPEEDS = {"foot": 5, "bike": 15, "car": 30, "scooter": 25}  # km/h
+# Distanza massima tra un punto e il nodo del grafo su cui viene agganciato
+MAX_SNAP_DISTANCE = 300.0  # metri
+
+# Velocita' (km/h) per tipo di strada; le strade assenti non sono percorribili con quel veicolo
+_FOOT_WAYS = ["primary", "primary_link", "secondary", "secondary_link", "tertiary", "tertiary_link",
+              "unclassified", "residential", "living_street", "service", "pedestrian", "footway",
+              "path", "steps", "track", "cycleway", "crossing", "corridor", "platform"]
+_CAR_SPEEDS = {"motorway": 110, "motorway_link": 60, "trunk": 90, "trunk_link": 50,
+               "primary": 50, "primary_link": 40, "secondary": 50, "secondary_link": 40,
+               "tertiary": 40, "tertiary_link": 30, "unclassified": 30, "residential": 30,
+               "living_street": 10, "service": 15}
+PROFILES = {
+    "foot": {"speeds": {way: 5 for way in _FOOT_WAYS}, "oneway": False},
+    "bike": {"speeds": {**{way: 15 for way in _FOOT_WAYS if way not in ("steps", "footway", "corridor", "platform")},
+                        "pedestrian": 8, "footway": 8}, "oneway": True},
+    "car": {"speeds": _CAR_SPEEDS, "oneway": True},
+    "scooter": {"speeds": {way: min(speed, 45) for way, speed in _CAR_SPEEDS.items()
+                           if not way.startswith("motorway")}, "oneway": True},
+}
+
+# Codici "sign" delle istruzioni GraphHopper
+_TURN_TEXT = {-3: "Turn sharp left", -2: "Turn left", -1: "Turn slight left", 0: "Continue",
+              1: "Turn slight right", 2: "Turn right", 3: "Turn sharp right"}
+SIGN_FINISH = 4
+
+_graphs = {}
+_graphs_lock = threading.Lock()
+_route_cache = TTLCache(maxsize=ROUTE_CACHE_SIZE, ttl=ROUTE_CACHE_TTL)
+_route_cache_lock = threading.Lock()
+_travel_times_cache = TTLCache(maxsize=TRAVEL_TIMES_CACHE_SIZE, ttl=ROUTE_CACHE_TTL)
+_snap_cache = TTLCache(maxsize=TRAVEL_TIMES_CACHE_SIZE, ttl=ROUTE_CACHE_TTL)
+
+
+class RoutingError(Exception):
+    pass
+
+
+class RoadGraph:
+    """
+    Routable graph of the ways in a local OSM GeoJSON export.
+
+    Ways that share a coordinate are connected there. Each travel profile
+    keeps its own adjacency lists, weighted by travel time, and answers
+    point-to-point queries with A*.
+    """
+
+    def __init__(self, path, mtime, ways):
+        self.path = path
+        self.mtime = mtime
+        node_ids = {}
+        lat, lon = [], []
+        # (u, v, lunghezza in metri, indice della way) per ogni tratto
+        segments = []
+        self.way_names = []
+        way_highways = []
+        way_oneway = []
+
+        def node(coordinate):
+            key = (round(coordinate[1], 7), round(coordinate[0], 7))
+            if key not in node_ids:
+                node_ids[key] = len(lat)
+                lat.append(key[0])
+                lon.append(key[1])
+            return node_ids[key]
+
+        for properties, coordinates in ways:
+            way = len(self.way_names)
+            self.way_names.append(properties.get("name", ""))
+            way_highways.append(properties.get("highway", ""))
+            oneway = properties.get("oneway", "no")
+            way_oneway.append(1 if oneway in ("yes", "true", "1") else -1 if oneway == "-1" else 0)
+            ids = [node(c) for c in coordinates]
+            for u, v in zip(ids[:-1], ids[1:]):
+                if u != v:
+                    segments.append((u, v, way))
+
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.index = SpatialIndex(self.lat, self.lon)
+        self.x, self.y = self.index.project(self.lat, self.lon)
+
+        self.adjacency = {}
+        self.max_speed = {}
+        self.routable = {}
+        for profile, settings in PROFILES.items():
+            speeds = settings["speeds"]
+            adjacency = [[] for _ in range(len(lat))]
+            routable = np.zeros(len(lat), dtype=bool)
+            for u, v, way in segments:
+                speed = speeds.get(way_highways[way])
+                if speed is None:
+                    continue
+                length = math.hypot(self.x[v] - self.x[u], self.y[v] - self.y[u])
+                seconds = length / (speed / 3.6)
+                oneway = way_oneway[way] if settings["oneway"] else 0
+                if oneway >= 0:
+                    adjacency[u].append((v, seconds, length, way))
+                if oneway <= 0:
+                    adjacency[v].append((u, seconds, length, way))
+                routable[u] = routable[v] = True
+            self.adjacency[profile] = adjacency
+            self.routable[profile] = routable
+            self.max_speed[profile] = max(speeds.values()) / 3.6
+
+    def __len__(self):
+        return len(self.lat)
+
+    @classmethod
+    def from_geojson(cls, path):
+        """
+        Load every LineString way of an OSM GeoJSON export.
+
+        Args:
+            path (str): Path to the GeoJSON file
+
+        Returns:
+            RoadGraph: The graph
+        """
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as f:
+            geojson_data = json.load(f)
+
+        ways = []
+        for feature in geojson_data["features"]:
+            geometry = feature["geometry"]
+            if geometry["type"] == "LineString":
+                ways.append((feature["properties"], geometry["coordinates"]))
+            elif geometry["type"] == "MultiLineString":
+                ways.extend((feature["properties"], part) for part in geometry["coordinates"])
+        return cls(path, mtime, ways)
+
+    def snap(self, coordinates, profile):
+        """Nearest node of the graph that the profile can use."""
+        idx, dist = self.index.nearest(coordinates[0], coordinates[1], k=1, mask=self.routable[profile])
+        if len(idx) == 0 or dist[0] > MAX_SNAP_DISTANCE:
+            raise RoutingError(f"No {profile} road within {MAX_SNAP_DISTANCE:.0f} m of {coordinates}")
+        return int(idx[0])
+
+    def shortest_path(self, source, target, profile):
+        """
+        Fastest path between two nodes with A*.
+
+        Returns:
+            list: Edges (from node, to node, seconds, metres, way) from source to target
+        """
+        adjacency = self.adjacency[profile]
+        max_speed = self.max_speed[profile]
+        x, y = self.x, self.y
+        tx, ty = x[target], y[target]
+
+        best = {source: 0.0}
+        previous = {}
+        heap = [(0.0, 0.0, source)]
+        while heap:
+            _, cost, u = heapq.heappop(heap)
+            if u == target:
+                break
+            if cost > best[u]:
+                continue
+            for v, seconds, length, way in adjacency[u]:
+                new_cost = cost + seconds
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    previous[v] = (u, seconds, length, way)
+                    heuristic = math.hypot(x[v] - tx, y[v] - ty) / max_speed
+                    heapq.heappush(heap, (new_cost + heuristic, new_cost, v))
+        else:
+            raise RoutingError("No route found between the selected points")
+
+        edges = []
+        node = target
+        while node != source:
+            u, seconds, length, way = previous[node]
+            edges.append((u, node, seconds, length, way))
+            node = u
+        edges.reverse()
+        return edges
+
+    def travel_times_from(self, source, profile):
+        """
+        Travel time in seconds from one node to every node (Dijkstra).
+
+        Returns:
+            np.ndarray: Seconds per node, inf where unreachable
+        """
+        adjacency = self.adjacency[profile]
+        times = np.full(len(self), np.inf)
+        best = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap:
+            cost, u = heapq.heappop(heap)
+            if cost > best[u]:
+                continue
+            times[u] = cost
+            for v, seconds, _, _ in adjacency[u]:
+                new_cost = cost + seconds
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    heapq.heappush(heap, (new_cost, v))
+        return times
+
+    def snap_many(self, lat, lon, profile):
+        """
+        Nearest usable node for each point.
+
+        Returns:
+            tuple: (node indices, snap distances in metres); -1 / inf when no node is close enough
+        """
+        nodes = np.full(len(lat), -1, dtype=np.int64)
+        distances = np.full(len(lat), np.inf)
+        for i in range(len(lat)):
+            idx, dist = self.index.nearest(lat[i], lon[i], k=1, mask=self.routable[profile])
+            if len(idx) and dist[0] <= MAX_SNAP_DISTANCE:
+                nodes[i], distances[i] = idx[0], dist[0]
+        return nodes, distances
+
+    def _bearing(self, u, v):
+        return math.degrees(math.atan2(self.x[v] - self.x[u], self.y[v] - self.y[u]))
+
+    def _turn_sign(self, before, after):
+        angle = (self._bearing(after[0], after[1]) - self._bearing(before[0], before[1]) + 180) % 360 - 180
+        for sign, limit in ((0, 20), (1, 45), (2, 120), (3, 180)):
+            if abs(angle) <= limit:
+                return sign if angle >= 0 else -sign
+        return 0
+
+    def route(self, start, end, profile):
+        """
+        Route between two coordinates, shaped like a GraphHopper /route response.
+
+        Args:
+            start (tuple): (latitude, longitude)
+            end (tuple): (latitude, longitude)
+            profile (str): One of PROFILES
+
+        Returns:
+            dict: {"paths": [{"points", "distance", "time", "instructions"}]}
+        """
+        if profile not in PROFILES:
+            raise RoutingError(f"Unknown travel profile: {profile}")
+        source = self.snap(start, profile)
+        target = self.snap(end, profile)
+        edges = self.shortest_path(source, target, profile) if source != target else []
+
+        points = [(self.lat[source], self.lon[source])] + [(self.lat[v], self.lon[v]) for _, v, _, _, _ in edges]
+        instructions = []
+        for i, (u, v, seconds, length, way) in enumerate(edges):
+            name = self.way_names[way]
+            if instructions and instructions[-1]["street_name"] == name:
+                instruction = instructions[-1]
+                instruction["distance"] += length
+                instruction["time"] += seconds * 1000
+                instruction["interval"][1] = i + 1
+                continue
+            sign = 0 if i == 0 else self._turn_sign(edges[i - 1], edges[i])
+            if i == 0:
+                text = "Continue" if not name else f"Continue onto {name}"
+            else:
+                text = _TURN_TEXT[sign] + (f" onto {name}" if name else "")
+            instructions.append({"text": text, "street_name": name, "sign": sign,
+                                 "distance": length, "time": seconds * 1000, "interval": [i, i + 1]})
+        instructions.append({"text": "Arrive at destination", "street_name": "", "sign": SIGN_FINISH,
+                             "distance": 0, "time": 0, "interval": [len(edges), len(edges)]})
+        for instruction in instructions:
+            instruction["distance"] = round(instruction["distance"], 1)
+            instruction["time"] = int(instruction["time"])
+
+        return {"paths": [{
+            "points": polyline.encode(points),
+            "distance": round(sum(e[3] for e in edges), 1),
+            "time": int(sum(e[2] for e in edges) * 1000),
+            "instructions": instructions
+        }]}
+
+
+def get_road_graph(path=STREETS_FILE):
+    """
+    Return the RoadGraph of the local extract, loading it at most once per process.
+
+    Args:
+        path (str): Path to the GeoJSON file
+
+    Returns:
+        RoadGraph: The cached graph
+    """
+    if not os.path.exists(path):
+        raise RoutingError(f"Local routing needs the street extract {path}")
+    mtime = os.path.getmtime(path)
+    with _graphs_lock:
+        graph = _graphs.get(path)
+        if graph is None or graph.mtime != mtime:
+            graph = RoadGraph.from_geojson(path)
+            _graphs[path] = graph
+        return graph
+
+
+def graphhopper_route(start, end, vehicle):
+    """
+    Route between two coordinates with the GraphHopper API.
+
+    Returns:
+        dict: The GraphHopper /route JSON response
+    """
+    response = http_client.get(GRAPHHOPPER_URL, params=[
+        ("point", f"{start[0]},{start[1]}"),
+        ("point", f"{end[0]},{end[1]}"),
+        ("type", "json"),
+        ("locale", "en"),
+        ("vehicle", vehicle),
+        ("key", os.getenv("GRAPHHOPPER_API_KEY"))
+    ], timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def snap_key(coordinates, decimals=SNAP_DECIMALS):
+    return (round(float(coordinates[0]), decimals), round(float(coordinates[1]), decimals))
+
+
+def get_route(start, end, vehicle, engine=None):
+    """
+    Route between two coordinates with the configured engine (ROUTING_ENGINE).
+
+    Results are cached in memory on (snapped start, snapped end, vehicle),
+    so reruns and visitors asking for nearly the same trip skip the engine.
+    The cached path also carries the decoded polyline as "coordinates".
+
+    Args:
+        start (tuple): (latitude, longitude)
+        end (tuple): (latitude, longitude)
+        vehicle (str): "foot", "bike", "car" or "scooter"
+        engine (str): Override ROUTING_ENGINE
+
+    Returns:
+        dict: A GraphHopper-shaped response; treat it as read-only
+    """
+    engine = engine or ROUTING_ENGINE
+    key = (snap_key(start), snap_key(end), vehicle, engine)
+    with _route_cache_lock:
+        data = _route_cache.get(key)
+    if data is not None:
+        return data
+
+    if engine == "local":
+        data = get_road_graph().route(start, end, vehicle)
+    else:
+        data = graphhopper_route(start, end, vehicle)
+    path = data['paths'][0]
+    path['coordinates'] = polyline.decode(path['points'])
+
+    with _route_cache_lock:
+        _route_cache[key] = data
+    return data
+
+
+def _estimate_travel_times(start, lat, lon, speed):
+    index = SpatialIndex(np.append(lat, start[0]), np.append(lon, start[1]))
+    x, y = index.project(lat, lon)
+    sx, sy = index.project(start[0], start[1])
+    return np.hypot(x - sx, y - sy) * DETOUR_FACTOR / speed
+
+
+def travel_times(start, lat, lon, vehicle):
+    """
+    Travel time in seconds from one start to many destinations.
+
+    With the local street extract this is a single Dijkstra search on the
+    road graph, cached per (snapped start, vehicle); every destination is
+    then a lookup. Without it, the time is estimated from the straight-line
+    distance times DETOUR_FACTOR. The GraphHopper matrix API is not used:
+    it is not part of the free plan and would add a network call per rerun.
+
+    Args:
+        start (tuple): (latitude, longitude)
+        lat (np.ndarray): Destination latitudes
+        lon (np.ndarray): Destination longitudes
+        vehicle (str): "foot", "bike", "car" or "scooter"
+
+    Returns:
+        np.ndarray: Seconds per destination, inf where unreachable
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    speed = FALLBACK_SPEEDS.get(vehicle, FALLBACK_SPEEDS["foot"]) / 3.6
+    try:
+        graph = get_road_graph()
+    except RoutingError:
+        graph = None
+
+    if graph is None:
+        return _estimate_travel_times(start, lat, lon, speed)
+
+    key = (snap_key(start), vehicle, graph.path, graph.mtime)
+    with _route_cache_lock:
+        times = _travel_times_cache.get(key)
+    if times is None:
+        try:
+            source = graph.snap(start, vehicle)
+        except RoutingError:
+            return _estimate_travel_times(start, lat, lon, speed)
+        times = graph.travel_times_from(source, vehicle)
+        with _route_cache_lock:
+            _travel_times_cache[key] = times
+
+    # Le destinazioni (es. i bagni filtrati) cambiano raramente tra un rerun e l'altro
+    snap_key_many = (lat.tobytes(), lon.tobytes(), vehicle, graph.path, graph.mtime)
+    with _route_cache_lock:
+        snapped = _snap_cache.get(snap_key_many)
+    if snapped is None:
+        snapped = graph.snap_many(lat, lon, vehicle)
+        with _route_cache_lock:
+            _snap_cache[snap_key_many] = snapped
+    nodes, snap_distances = snapped
+    result = np.where(nodes >= 0, times[nodes], np.inf)
+    # Tratto a piedi/su strada tra il nodo e il punto vero e proprio
+    return result + np.where(nodes >= 0, snap_distances / speed, 0.0)
@@ -0,0 +1,116 @@
+import math
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # metri
+DEFAULT_CELL_SIZE = 100.0  # metri
+
+
+class SpatialIndex:
+    """
+    Uniform grid index over points projected to a local metric plane.
+
+    Points are bucketed into square cells of `cell_size` metres and stored
+    sorted by cell key, so a query only looks at the cells overlapping its
+    search circle. Distances use an equirectangular projection centred on
+    the dataset, which is accurate to well under a metre at city scale.
+    """
+
+    def __init__(self, lat, lon, cell_size=DEFAULT_CELL_SIZE):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        self.cell_size = float(cell_size)
+        self.lat0 = float(lat.mean()) if len(lat) else 0.0
+        self._kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(self.lat0))
+        self._ky = math.radians(1) * EARTH_RADIUS
+
+        self.x, self.y = self.project(lat, lon)
+        if len(lat):
+            self.x0, self.y0 = float(self.x.min()), float(self.y.min())
+            self.nx = int((self.x.max() - self.x0) // self.cell_size) + 1
+            self.ny = int((self.y.max() - self.y0) // self.cell_size) + 1
+        else:
+            self.x0 = self.y0 = 0.0
+            self.nx = self.ny = 1
+        # Diagonale dell'area coperta: oltre questo raggio non ci sono altri punti
+        self._extent = math.hypot(self.nx, self.ny) * self.cell_size
+
+        ix, iy = self._cell(self.x, self.y)
+        keys = iy * self.nx + ix
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def __len__(self):
+        return len(self.x)
+
+    def project(self, lat, lon):
+        """Project lat/lon (degrees) to local x/y coordinates in metres."""
+        return np.asarray(lon, dtype=np.float64) * self._kx, np.asarray(lat, dtype=np.float64) * self._ky
+
+    def _cell(self, x, y):
+        ix = np.clip(((x - self.x0) // self.cell_size).astype(np.int64), 0, self.nx - 1)
+        iy = np.clip(((y - self.y0) // self.cell_size).astype(np.int64), 0, self.ny - 1)
+        return ix, iy
+
+    def _candidates(self, x, y, radius):
+        # Righe di celle che intersecano il quadrato di lato 2*radius
+        ix0 = max(int((x - radius - self.x0) // self.cell_size), 0)
+        ix1 = min(int((x + radius - self.x0) // self.cell_size), self.nx - 1)
+        iy0 = max(int((y - radius - self.y0) // self.cell_size), 0)
+        iy1 = min(int((y + radius - self.y0) // self.cell_size), self.ny - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(iy0, iy1 + 1) * self.nx
+        starts = np.searchsorted(self._keys, rows + ix0, side="left")
+        ends = np.searchsorted(self._keys, rows + ix1, side="right")
+        return np.concatenate([self._order[s:e] for s, e in zip(starts, ends)])
+
+    def within_radius(self, lat, lon, radius, mask=None):
+        """
+        Find the points within `radius` metres of a location.
+
+        Args:
+            lat (float): Latitude of the query point
+            lon (float): Longitude of the query point
+            radius (float): Search radius in metres
+            mask (np.ndarray): Optional boolean row mask restricting the candidates
+
+        Returns:
+            tuple: (row indices, distances in metres), sorted by distance
+        """
+        x, y = self.project(lat, lon)
+        idx = self._candidates(float(x), float(y), radius)
+        if mask is not None:
+            idx = idx[mask[idx]]
+        dist = np.hypot(self.x[idx] - x, self.y[idx] - y)
+        keep = dist <= radius
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat, lon, k=1, mask=None):
+        """
+        Find the k points closest to a location.
+
+        The search radius starts at one cell and doubles until the circle
+        holds at least k points, so only nearby cells are scanned.
+
+        Args:
+            lat (float): Latitude of the query point
+            lon (float): Longitude of the query point
+            k (int): Number of neighbours
+            mask (np.ndarray): Optional boolean row mask restricting the candidates
+
+        Returns:
+            tuple: (row indices, distances in metres), sorted by distance
+        """
+        x, y = self.project(lat, lon)
+        x, y = float(x), float(y)
+        # Distanza minima dal punto al rettangolo della griglia
+        dx = max(self.x0 - x, 0.0, x - (self.x0 + self.nx * self.cell_size))
+        dy = max(self.y0 - y, 0.0, y - (self.y0 + self.ny * self.cell_size))
+        radius = max(self.cell_size, math.hypot(dx, dy) + self.cell_size)
+        while True:
+            idx, dist = self.within_radius(lat, lon, radius, mask)
+            if len(idx) >= k or radius > math.hypot(dx, dy) + self._extent:
+                return idx[:k], dist[:k]
+            radius *= 2
@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+import numpy as np
+from spatial_index import SpatialIndex
+
+STREETS_FILE = os.path.join('data', 'strade_lucca.geojson')
+# I segmenti piu' lunghi vengono spezzati, cosi' il punto medio resta vicino a ogni punto del segmento
+MAX_SEGMENT_LENGTH = 50.0  # metri
+# Oltre questa distanza la strada piu' vicina non e' considerata l'indirizzo del punto
+MAX_STREET_DISTANCE = 150.0  # metri
+
+# Componenti usati quando la strada non li riporta nei tag OSM
+DEFAULT_ADDRESS = {
+    "district": "Lucca",
+    "city": "Lucca",
+    "region": "Tuscany",
+    "postal_code": "55100",
+    "state": "Italy"
+}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+class StreetIndex:
+    """
+    Offline reverse geocoder over the named streets of a local OSM extract.
+
+    Street geometries are cut into short segments whose midpoints go into a
+    SpatialIndex. A lookup scans the few nearby segments and returns the
+    closest street with its address components.
+    """
+
+    def __init__(self, path, mtime, lines):
+        self.path = path
+        self.mtime = mtime
+        self.streets = []  # componenti dell'indirizzo per ogni strada
+        lat1, lon1, lat2, lon2, street = [], [], [], [], []
+
+        for properties, coordinates in lines:
+            street_id = len(self.streets)
+            self.streets.append({
+                "street": properties["name"],
+                "district": properties.get("addr:suburb", DEFAULT_ADDRESS["district"]),
+                "city": properties.get("addr:city", DEFAULT_ADDRESS["city"]),
+                "region": DEFAULT_ADDRESS["region"],
+                "postal_code": properties.get("addr:postcode", properties.get("postal_code", DEFAULT_ADDRESS["postal_code"])),
+                "state": DEFAULT_ADDRESS["state"]
+            })
+            for (a_lon, a_lat), (b_lon, b_lat) in zip(coordinates[:-1], coordinates[1:]):
+                lat1.append(a_lat)
+                lon1.append(a_lon)
+                lat2.append(b_lat)
+                lon2.append(b_lon)
+                street.append(street_id)
+
+        lat1, lon1, lat2, lon2 = (np.asarray(a, dtype=np.float64) for a in (lat1, lon1, lat2, lon2))
+        street = np.asarray(street, dtype=np.int64)
+
+        # Spezza i segmenti lunghi in parti di al massimo MAX_SEGMENT_LENGTH metri
+        probe = SpatialIndex(np.concatenate([lat1, lat2]), np.concatenate([lon1, lon2]))
+        x1, y1 = probe.project(lat1, lon1)
+        x2, y2 = probe.project(lat2, lon2)
+        pieces = np.maximum(np.ceil(np.hypot(x2 - x1, y2 - y1) / MAX_SEGMENT_LENGTH), 1).astype(np.int64)
+        seg = np.repeat(np.arange(len(pieces)), pieces)
+        first = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        t0 = (np.arange(len(seg)) - first) / pieces[seg]
+        t1 = t0 + 1.0 / pieces[seg]
+        self.lat1 = lat1[seg] + (lat2[seg] - lat1[seg]) * t0
+        self.lon1 = lon1[seg] + (lon2[seg] - lon1[seg]) * t0
+        self.lat2 = lat1[seg] + (lat2[seg] - lat1[seg]) * t1
+        self.lon2 = lon1[seg] + (lon2[seg] - lon1[seg]) * t1
+        self.street = street[seg]
+
+        self.index = SpatialIndex((self.lat1 + self.lat2) / 2, (self.lon1 + self.lon2) / 2)
+        self.x1, self.y1 = self.index.project(self.lat1, self.lon1)
+        self.x2, self.y2 = self.index.project(self.lat2, self.lon2)
+
+    def __len__(self):
+        return len(self.street)
+
+    @classmethod
+    def from_geojson(cls, path):
+        """
+        Load the named LineString features of an OSM GeoJSON export.
+
+        Args:
+            path (str): Path to the GeoJSON file
+
+        Returns:
+            StreetIndex: The index
+        """
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as f:
+            geojson_data = json.load(f)
+
+        lines = []
+        for feature in geojson_data["features"]:
+            properties = feature["properties"]
+            geometry = feature["geometry"]
+            if not properties.get("name"):
+                continue
+            if geometry["type"] == "LineString":
+                lines.append((properties, geometry["coordinates"]))
+            elif geometry["type"] == "MultiLineString":
+                lines.extend((properties, part) for part in geometry["coordinates"])
+        return cls(path, mtime, lines)
+
+    def lookup(self, coordinates, max_distance=MAX_STREET_DISTANCE):
+        """
+        Closest named street to a coordinate pair.
+
+        Args:
+            coordinates (tuple): (latitude, longitude)
+            max_distance (float): Search radius in metres
+
+        Returns:
+            dict: Address components plus "distance" in metres, or None if no street is close enough
+        """
+        lat, lon = float(coordinates[0]), float(coordinates[1])
+        # Il punto medio dista al massimo MAX_SEGMENT_LENGTH / 2 da ogni punto del segmento
+        idx, _ = self.index.within_radius(lat, lon, max_distance + MAX_SEGMENT_LENGTH / 2)
+        if len(idx) == 0:
+            return None
+
+        px, py = self.index.project(lat, lon)
+        x1, y1, dx, dy = self.x1[idx], self.y1[idx], self.x2[idx] - self.x1[idx], self.y2[idx] - self.y1[idx]
+        length2 = dx * dx + dy * dy
+        t = np.clip(((px - x1) * dx + (py - y1) * dy) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+        dist = np.hypot(x1 + t * dx - px, y1 + t * dy - py)
+        best = int(np.argmin(dist))
+        if dist[best] > max_distance:
+            return None
+
+        address = dict(self.streets[self.street[idx[best]]])
+        address["distance"] = float(dist[best])
+        return address
+
+
+def format_address(address):
+    """
+    Join address components in the same order as a Nominatim display address.
+
+    The result has the six fields that write_formatted_address expects.
+    """
+    return ", ".join(address[key] for key in ("street", "district", "city", "region", "postal_code", "state"))
+
+
+def get_street_index(path=STREETS_FILE):
+    """
+    Return the StreetIndex of the local extract, loading it at most once per process.
+
+    Args:
+        path (str): Path to the GeoJSON file
+
+    Returns:
+        StreetIndex: The cached index, or None if the extract is not available
+    """
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None or index.mtime != mtime:
+            index = StreetIndex.from_geojson(path)
+            _indexes[path] = index
+        return index
@@ -1,35 +1,130 @@
-import requests
 import os
+import time
+import threading
+import http_client
 from dotenv import load_dotenv
 
 # Carica il file .env
 load_dotenv()
 
-API_TOKEN = ""
 PROJECT_ID = os.getenv('PROJECT_ID')
+# Endpoint di watsonx.ai e di IBM IAM, sovrascrivibili per usare un server locale
+WATSONX_URL = os.getenv('WATSONX_URL', 'https://eu-de.ml.cloud.ibm.com').rstrip('/')
+IAM_URL = os.getenv('IAM_URL', 'https://iam.cloud.ibm.com/identity/token')
+# Risposte dei modelli in streaming (server-sent events) invece di attendere il testo completo
+WATSONX_STREAMING = os.getenv('WATSONX_STREAMING', '1') == '1'
+# Il token viene rinnovato in background REFRESH_MARGIN secondi prima della scadenza
+REFRESH_MARGIN = 5 * 60
+# Attesa prima di riprovare dopo un rinnovo fallito
+RETRY_DELAY = 30
+
+
+class IAMTokenManager:
+    """
+    One IBM IAM token per process, shared by every Streamlit session.
+
+    get_token returns any unexpired token without locking. Only when there
+    is none does a caller fetch it, while concurrent callers wait on the
+    same request, so a burst of new sessions costs a single IAM call; if
+    that call fails, the waiters get "" at once and nobody asks IAM again
+    for RETRY_DELAY seconds. A background thread renews the token
+    refresh_margin seconds before it expires, so callers normally never
+    wait.
+    """
+
+    def __init__(self, api_key, refresh_margin=REFRESH_MARGIN):
+        self.api_key = api_key
+        self.refresh_margin = refresh_margin
+        # (token, scadenza) assegnati insieme: i lettori senza lock non vedono mai meta' aggiornamento
+        self._current = (None, 0.0)
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._refresher = None
+
+    def _fetch(self):
+        # Define the headers and the data payload
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        data = {
+            'grant_type': 'urn:ibm:params:oauth:grant-type:apikey',
+            'apikey': self.api_key
+        }
+
+        # Send the POST request
+        response = http_client.post(IAM_URL, headers=headers, data=data)
+
+        # Check the response status
+        if response.status_code != 200:
+            print(f"Failed to retrieve token. Status code: {response.status_code}")
+            return False
+        token = response.json()
+        self._current = (token['access_token'], token.get('expiration', time.time() + token.get('expires_in', 3600)))
+        return True
+
+    def _expires_in(self):
+        token, expires_at = self._current
+        return expires_at - time.time() if token is not None else 0.0
+
+    def _refresh(self, min_validity):
+        # Un solo rinnovo alla volta; dopo un errore nessun nuovo tentativo fino a _retry_at
+        with self._lock:
+            if self._expires_in() > min_validity or time.time() < self._retry_at:
+                return
+            try:
+                ok = self._fetch()
+            except Exception as e:
+                print(f"Failed to retrieve token: {e}")
+                ok = False
+            if not ok:
+                self._retry_at = time.time() + RETRY_DELAY
+
+    def get_token(self):
+        """
+        Current access token, fetched only if there is no unexpired one.
+
+        Returns:
+            str: The token, "" if IAM could not be reached
+        """
+        if self._expires_in() <= 0:
+            self._refresh(0)
+        return self._current[0] if self._expires_in() > 0 else ""
+
+    def start(self):
+        """Start the background refresh thread (once)."""
+        with self._start_lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(target=self._run, name="iam-token-refresh", daemon=True)
+            self._refresher.start()
+
+    def _run(self):
+        while True:
+            self._refresh(self.refresh_margin)
+            delay = self._expires_in() - self.refresh_margin
+            if delay <= 0:
+                delay = max(self._retry_at - time.time(), RETRY_DELAY)
+            time.sleep(max(delay, 1))
+
+
+token_manager = IAMTokenManager(os.getenv('API_KEY'))
+
+
+def report_first_token(chunks, label):
+    """Pass a stream of text chunks through, printing time to first token and total time."""
+    start = time.perf_counter()
+    first_token = None
+    for chunk in chunks:
+        if first_token is None and chunk:
+            first_token = time.perf_counter() - start
+            print(f"{label}: first token after {first_token * 1000:.0f} ms")
+        yield chunk
+    print(f"{label}: stream completed in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def get_api_token():
+    return token_manager.get_token()
+
 
 def setup():
-    global API_TOKEN  # Dichiara che stai modificando la variabile globale
-    API_KEY = os.getenv('API_KEY')
-
-    # Define the URL and headers
-    url = 'https://iam.cloud.ibm.com/identity/token'
-    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-
-    # Define the data payload
-    data = {
-        'grant_type': 'urn:ibm:params:oauth:grant-type:apikey',
-        'apikey': API_KEY
-    }
-
-    # Send the POST request
-    response = requests.post(url, headers=headers, data=data)
-
-    # Check the response status
-    if response.status_code == 200:
-        # print("Token response:")
-        # print(response.json())
-        API_TOKEN = response.json()['access_token']
-    else:
-        print(f"Failed to retrieve token. Status code: {response.status_code}")
-        # print(response.text)
\ No newline at end of file
+    # Avvia il rinnovo automatico del token; non blocca il primo render
+    token_manager.start()